@@ -0,0 +1,119 @@
+"""Board context for persona prompts, bounded by a token budget.
+
+The prompt always carries a compact index of every node (id and label, grouped
+by kind) so the model can reference anything on the board. Full node details
+are then added in order of relevance: nodes that share words with the user's
+message (or are named by id) first, then their connected neighbours, then
+everything else, for as long as the budget lasts. Small boards therefore go in
+whole. On large ones the model can fetch any node it didn't get through the
+`get_node` tool.
+"""
+from __future__ import annotations
+
+import json
+import re
+
+from .models import Board, BoardNode
+
+LABEL_CHARS = 60
+
+_WORD = re.compile(r"[a-z0-9']+")
+_ID_TOKEN = re.compile(r"[\w-]+")
+_STOPWORDS = frozenset(
+    "the and for with that this from into onto about have has had was were are "
+    "you your can could would should will please make add more some them they "
+    "their there then than what when where which who how why let its it's our "
+    "card cards board node nodes".split()
+)
+
+
+def approx_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) for budgeting and reports."""
+    return (len(text) + 3) // 4
+
+
+def compact_json(data) -> str:
+    """Deterministic, whitespace-free JSON; non-ASCII stays literal (escapes cost tokens)."""
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def _words(text: str) -> set[str]:
+    return {w for w in _WORD.findall(text.lower()) if len(w) > 2 and w not in _STOPWORDS}
+
+
+def _label(n: BoardNode) -> str:
+    label = n.name or n.title or ""
+    return label if len(label) <= LABEL_CHARS else label[: LABEL_CHARS - 1] + "…"
+
+
+def _names_id(node_id: str, tokens: set[str], message: str) -> bool:
+    """Whether `message` mentions `node_id` as a whole token ("n1" is not in "n10")."""
+    if _ID_TOKEN.fullmatch(node_id):
+        return node_id in tokens
+    return re.search(rf"(?<![\w-]){re.escape(node_id)}(?![\w-])", message) is not None
+
+
+def _score(n: BoardNode, query: set[str], tokens: set[str], message: str) -> int:
+    if _names_id(n.id, tokens, message):
+        return 100
+    head = _words(" ".join(p for p in (n.name, n.title) if p))
+    rest = _words(" ".join(str(p) for p in (n.role, n.body, n.age, *(n.tags or ())) if p))
+    return 3 * len(query & head) + len(query & rest)
+
+
+def node_details(n: BoardNode, links: list[list[str]]) -> dict:
+    # Canvas positions mean nothing to the model; leave them out.
+    detail = {
+        k: v for k, v in n.model_dump(exclude={"x", "y"}).items() if v not in (None, [], "")
+    }
+    if links:
+        detail["links"] = links
+    return detail
+
+
+def build_board_context(board: Board, message: str, budget: int) -> str:
+    """JSON view of `board` for a persona turn, within ~`budget` tokens where
+    possible (the index alone may exceed it on huge boards)."""
+    links: dict[str, list[list[str]]] = {n.id: [] for n in board.nodes}
+    neighbours: dict[str, list[str]] = {n.id: [] for n in board.nodes}
+    for c in board.connections:
+        if c.from_ in links and c.to in links:
+            links[c.from_].append([c.to, c.label] if c.label else [c.to])
+            links[c.to].append([c.from_, c.label] if c.label else [c.from_])
+            neighbours[c.from_].append(c.to)
+            neighbours[c.to].append(c.from_)
+
+    query = _words(message)
+    tokens = set(_ID_TOKEN.findall(message))
+    scored = sorted(
+        ((s, i, n) for i, n in enumerate(board.nodes) if (s := _score(n, query, tokens, message)) > 0),
+        key=lambda t: (-t[0], t[1]),
+    )
+    by_id = {n.id: n for n in board.nodes}
+    order: list[BoardNode] = [n for _, _, n in scored]
+    seen = {n.id for n in order}
+    for n in list(order):
+        for other in neighbours[n.id]:
+            if other not in seen:
+                seen.add(other)
+                order.append(by_id[other])
+    order.extend(n for n in board.nodes if n.id not in seen)
+
+    index: dict[str, list[list[str]]] = {}
+    for n in board.nodes:
+        index.setdefault(n.kind, []).append([n.id, _label(n)])
+    used = approx_tokens(compact_json({"title": board.title, "index": index})) + 20
+    details: list[dict] = []
+    for n in order:
+        detail = node_details(n, links[n.id])
+        cost = approx_tokens(compact_json(detail)) + 1
+        if used + cost > budget:
+            break
+        used += cost
+        details.append(detail)
+
+    view: dict = {"title": board.title, "index": index, "details": details}
+    omitted = len(board.nodes) - len(details)
+    if omitted:
+        view["omitted"] = f"{omitted} nodes listed in index only; call get_node for their details"
+    return compact_json(view)
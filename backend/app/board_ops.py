@@ -0,0 +1,234 @@
+"""Apply a list of node/connection operations to a board and record what changed.
+
+Also home to the board patch format shared by PATCH responses and the revision
+log: `diff_boards` produces one, `apply_patch` replays it.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
+from .models import (
+    AddNodeOp,
+    Board,
+    BoardNode,
+    BoardOp,
+    Connection,
+    DeleteNodeOp,
+    LinkOp,
+    MoveNodeOp,
+    SetBoardOp,
+    UnlinkOp,
+    UpdateNodeOp,
+)
+
+
+class BoardOpError(ValueError):
+    def __init__(self, index: int, message: str) -> None:
+        super().__init__(f"op {index}: {message}")
+        self.index = index
+
+
+def pair(a: str, b: str) -> frozenset[str]:
+    """Connections are unique per unordered pair of endpoints."""
+    return frozenset((a, b))
+
+
+@dataclass
+class BoardChanges:
+    """Entities touched by a batch of edits, keyed so repeated edits collapse."""
+
+    board: dict = field(default_factory=dict)
+    nodes: dict[str, BoardNode] = field(default_factory=dict)
+    removed_nodes: set[str] = field(default_factory=set)
+    connections: dict[frozenset[str], Connection] = field(default_factory=dict)
+    removed_connections: dict[frozenset[str], Connection] = field(default_factory=dict)
+
+    def __bool__(self) -> bool:
+        return bool(
+            self.board or self.nodes or self.removed_nodes
+            or self.connections or self.removed_connections
+        )
+
+    def clear(self) -> None:
+        self.board.clear()
+        self.nodes.clear()
+        self.removed_nodes.clear()
+        self.connections.clear()
+        self.removed_connections.clear()
+
+    def node_changed(self, node: BoardNode) -> None:
+        self.nodes[node.id] = node
+        self.removed_nodes.discard(node.id)
+
+    def node_removed(self, node_id: str) -> None:
+        self.nodes.pop(node_id, None)
+        self.removed_nodes.add(node_id)
+
+    def connection_changed(self, conn: Connection) -> None:
+        key = pair(conn.from_, conn.to)
+        self.connections[key] = conn
+        self.removed_connections.pop(key, None)
+
+    def connection_removed(self, conn: Connection) -> None:
+        key = pair(conn.from_, conn.to)
+        self.connections.pop(key, None)
+        self.removed_connections[key] = conn
+
+    def as_patch(self) -> dict:
+        return {
+            "board": self.board,
+            "nodes": [n.model_dump() for n in self.nodes.values()],
+            "removedNodes": sorted(self.removed_nodes),
+            "connections": [c.model_dump(by_alias=True) for c in self.connections.values()],
+            "removedConnections": [
+                c.model_dump(by_alias=True) for c in self.removed_connections.values()
+            ],
+        }
+
+
+def apply_ops(board: Board, ops: list[BoardOp]) -> BoardChanges:
+    """Apply `ops` in order, mutating `board`.
+
+    Raises BoardOpError on the first invalid op; the board may then be partially
+    modified, so callers apply to a copy they can discard.
+    """
+    changes = BoardChanges()
+    nodes = {n.id: i for i, n in enumerate(board.nodes)}
+
+    def index_of(i: int, node_id: str) -> int:
+        if node_id not in nodes:
+            raise BoardOpError(i, f"no node with id {node_id!r}")
+        return nodes[node_id]
+
+    for i, op in enumerate(ops):
+        if isinstance(op, MoveNodeOp):
+            pos = index_of(i, op.id)
+            node = board.nodes[pos].model_copy(update={"x": op.x, "y": op.y})
+            board.nodes[pos] = node
+            changes.node_changed(node)
+        elif isinstance(op, UpdateNodeOp):
+            pos = index_of(i, op.id)
+            update = {k: getattr(op.fields, k) for k in op.fields.model_fields_set}
+            node = BoardNode(**{**board.nodes[pos].model_dump(), **update})
+            board.nodes[pos] = node
+            changes.node_changed(node)
+        elif isinstance(op, AddNodeOp):
+            if op.node.id in nodes:
+                raise BoardOpError(i, f"node id {op.node.id!r} already exists")
+            nodes[op.node.id] = len(board.nodes)
+            board.nodes.append(op.node)
+            changes.node_changed(op.node)
+        elif isinstance(op, DeleteNodeOp):
+            index_of(i, op.id)
+            board.nodes = [n for n in board.nodes if n.id != op.id]
+            nodes = {n.id: j for j, n in enumerate(board.nodes)}
+            changes.node_removed(op.id)
+            kept = []
+            for c in board.connections:
+                if op.id in (c.from_, c.to):
+                    changes.connection_removed(c)
+                else:
+                    kept.append(c)
+            board.connections = kept
+        elif isinstance(op, LinkOp):
+            index_of(i, op.from_)
+            index_of(i, op.to)
+            if op.from_ == op.to:
+                raise BoardOpError(i, "cannot link a node to itself")
+            key = pair(op.from_, op.to)
+            conn = Connection(**{"from": op.from_, "to": op.to, "label": op.label or None})
+            for j, c in enumerate(board.connections):
+                if pair(c.from_, c.to) == key:
+                    board.connections[j] = conn
+                    break
+            else:
+                board.connections.append(conn)
+            changes.connection_changed(conn)
+        elif isinstance(op, UnlinkOp):
+            key = pair(op.from_, op.to)
+            kept = []
+            for c in board.connections:
+                if pair(c.from_, c.to) == key:
+                    changes.connection_removed(c)
+                else:
+                    kept.append(c)
+            if len(kept) == len(board.connections):
+                raise BoardOpError(i, f"no connection between {op.from_!r} and {op.to!r}")
+            board.connections = kept
+        elif isinstance(op, SetBoardOp):
+            for k in op.model_fields_set - {"op"}:
+                value = getattr(op, k)
+                if value is None:
+                    raise BoardOpError(i, f"{k} cannot be null")
+                setattr(board, k, value)
+                changes.board[k] = value
+    return changes
+
+
+def diff_boards(old: Board, new: Board) -> dict:
+    """Patch that turns `old` into `new`, including ordering when it changed."""
+    changes = BoardChanges()
+    for k in ("title", "personaName", "palette"):
+        if getattr(old, k) != getattr(new, k):
+            changes.board[k] = getattr(new, k)
+
+    old_nodes = {n.id: n for n in old.nodes}
+    new_ids = [n.id for n in new.nodes]
+    for n in new.nodes:
+        if old_nodes.get(n.id) != n:
+            changes.node_changed(n)
+    for node_id in old_nodes.keys() - set(new_ids):
+        changes.node_removed(node_id)
+
+    old_conns = {pair(c.from_, c.to): c for c in old.connections}
+    new_conns = {pair(c.from_, c.to): c for c in new.connections}
+    for key, c in new_conns.items():
+        if old_conns.get(key) != c:
+            changes.connection_changed(c)
+    for key in old_conns.keys() - new_conns.keys():
+        changes.connection_removed(old_conns[key])
+
+    patch = changes.as_patch()
+    # apply_patch keeps survivors in place and appends newcomers; only spell out
+    # the order when that would not reproduce `new`.
+    surviving = set(new_ids)
+    kept = [n.id for n in old.nodes if n.id in surviving]
+    added = [i for i in new_ids if i not in old_nodes]
+    if kept + added != new_ids:
+        patch["nodeOrder"] = new_ids
+    kept_c = [k for k in (pair(c.from_, c.to) for c in old.connections) if k in new_conns]
+    added_c = [k for k in new_conns if k not in old_conns]
+    if kept_c + added_c != list(new_conns):
+        patch["connectionOrder"] = [[c.from_, c.to] for c in new.connections]
+    return patch
+
+
+def apply_patch(board: Board, patch: dict) -> Board:
+    """Replay a patch from `diff_boards` or `BoardChanges.as_patch` onto `board`."""
+    for k, v in patch.get("board", {}).items():
+        setattr(board, k, v)
+
+    removed = set(patch.get("removedNodes", []))
+    upserts = {n["id"]: BoardNode.model_validate(n) for n in patch.get("nodes", [])}
+    nodes = [upserts.pop(n.id, n) for n in board.nodes if n.id not in removed]
+    nodes.extend(upserts.values())
+    if "nodeOrder" in patch:
+        by_id = {n.id: n for n in nodes}
+        nodes = [by_id[i] for i in patch["nodeOrder"]]
+    board.nodes = nodes
+
+    gone = {pair(c["from"], c["to"]) for c in patch.get("removedConnections", [])}
+    conn_upserts = {
+        pair(c["from"], c["to"]): Connection.model_validate(c) for c in patch.get("connections", [])
+    }
+    conns = [
+        conn_upserts.pop(pair(c.from_, c.to), c)
+        for c in board.connections
+        if pair(c.from_, c.to) not in gone
+    ]
+    conns.extend(conn_upserts.values())
+    if "connectionOrder" in patch:
+        by_key = {pair(c.from_, c.to): c for c in conns}
+        conns = [by_key[pair(a, b)] for a, b in patch["connectionOrder"]]
+    board.connections = conns
+    return board
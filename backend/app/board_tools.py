@@ -3,10 +3,14 @@ from __future__ import annotations
 
 import random
 import string
-from typing import Callable
+from typing import Callable, Literal
 
 from langchain_core.tools import StructuredTool
+from pydantic import BaseModel, Field
 
+from .board_context import compact_json, node_details
+from .board_ops import BoardChanges
+from .indexed_board import IndexedBoard
 from .models import Board, BoardNode, Connection
 
 LANE_Y = {"character": 120, "world": 420, "tone": 440, "beat": 720}
@@ -14,30 +18,63 @@ LANE_STEP_X = 240
 LANE_START_X = 220
 
 
+NODE_FIELDS = ("name", "title", "role", "body", "age", "tags")
+
+
+class BoardEditOp(BaseModel):
+    """One step of an apply_board_ops batch."""
+
+    op: Literal["add", "update", "delete", "link", "unlink"]
+    kind: Literal["character", "world", "tone", "beat"] | None = Field(
+        default=None, description="add: card kind (world = setting)",
+    )
+    ref: str | None = Field(
+        default=None, description="add: placeholder like '$hero' that later ops can use as an id",
+    )
+    id: str | None = Field(default=None, description="update/delete: node id or placeholder")
+    from_id: str | None = Field(default=None, description="link/unlink: node id or placeholder")
+    to_id: str | None = Field(default=None, description="link/unlink: node id or placeholder")
+    label: str | None = Field(default=None, description="link: relationship label")
+    name: str | None = None
+    title: str | None = None
+    role: str | None = None
+    body: str | None = None
+    age: str | None = None
+    tags: list[str] | None = None
+
+
 def _new_id() -> str:
     return "n" + "".join(random.choices(string.ascii_lowercase + string.digits, k=8))
 
 
-def _place(board: Board, kind: str) -> tuple[float, float]:
-    same = [n for n in board.nodes if n.kind == kind]
-    if not same:
+def _place(index: IndexedBoard, kind: str) -> tuple[float, float]:
+    rightmost = index.rightmost_x(kind)
+    if rightmost is None:
         return (LANE_START_X, LANE_Y[kind])
-    rightmost = max(n.x for n in same)
     return (rightmost + LANE_STEP_X, LANE_Y[kind])
 
 
 def build_board_tools(
-    board: Board,
+    board: Board | IndexedBoard,
     persist: Callable[[Board], None],
+    changes: BoardChanges | None = None,
 ) -> list[StructuredTool]:
     """Return tools that mutate `board` and call `persist` after each change.
 
     The returned tools close over `board`, so mutations accumulate across calls
-    within a single persona turn.
+    within a single persona turn. They work on an IndexedBoard, so lookups and
+    edits don't scan the board. Given a plain Board, the tools wrap it and write
+    every change back before calling `persist`; given an IndexedBoard, that is
+    left to the caller (`index.sync()` before saving), which keeps a burst of
+    edits linear. Every change is also recorded in `changes`, if given, so the
+    caller can report a patch instead of the whole board.
     """
+    changes = changes if changes is not None else BoardChanges()
+    eager = not isinstance(board, IndexedBoard)
+    index = IndexedBoard(board) if eager else board
 
     def _save() -> None:
-        persist(board)
+        persist(index.sync() if eager else index.board)
 
     def add_character(
         name: str,
@@ -53,37 +90,41 @@ def build_board_tools(
         tags: 2-4 single-word traits (optional).
         Returns the new node id.
         """
-        x, y = _place(board, "character")
+        x, y = _place(index, "character")
         node = BoardNode(
             id=_new_id(), kind="character", x=x, y=y,
             name=name, role=role or None, body=body or None,
             age=age or None, tags=list(tags) if tags else None,
         )
-        board.nodes.append(node)
+        index.add_node(node)
+        changes.node_changed(node)
         _save()
         return f"Added character {node.id} — {name}"
 
     def add_setting(title: str, body: str = "") -> str:
         """Add a world/setting card (time, place, circumstances)."""
-        x, y = _place(board, "world")
+        x, y = _place(index, "world")
         node = BoardNode(id=_new_id(), kind="world", x=x, y=y, title=title, body=body or None)
-        board.nodes.append(node)
+        index.add_node(node)
+        changes.node_changed(node)
         _save()
         return f"Added setting {node.id} — {title}"
 
     def add_tone(title: str, body: str = "") -> str:
         """Add a tone card describing voice, mood, or pacing."""
-        x, y = _place(board, "tone")
+        x, y = _place(index, "tone")
         node = BoardNode(id=_new_id(), kind="tone", x=x, y=y, title=title, body=body or None)
-        board.nodes.append(node)
+        index.add_node(node)
+        changes.node_changed(node)
         _save()
         return f"Added tone {node.id} — {title}"
 
     def add_beat(title: str, body: str = "") -> str:
         """Add a plot beat. Beats appear left-to-right in the bottom lane."""
-        x, y = _place(board, "beat")
+        x, y = _place(index, "beat")
         node = BoardNode(id=_new_id(), kind="beat", x=x, y=y, title=title, body=body or None)
-        board.nodes.append(node)
+        index.add_node(node)
+        changes.node_changed(node)
         _save()
         return f"Added beat {node.id} — {title}"
 
@@ -100,57 +141,188 @@ def build_board_tools(
 
         Pass an empty string to clear a field.
         """
-        for i, n in enumerate(board.nodes):
-            if n.id != node_id:
-                continue
-            data = n.model_dump()
-            if name is not None: data["name"] = name or None
-            if title is not None: data["title"] = title or None
-            if role is not None: data["role"] = role or None
-            if body is not None: data["body"] = body or None
-            if age is not None: data["age"] = age or None
-            if tags is not None: data["tags"] = list(tags) if tags else None
-            board.nodes[i] = BoardNode(**data)
-            _save()
-            return f"Updated {node_id}"
-        return f"No node with id {node_id}"
+        n = index.get(node_id)
+        if n is None:
+            return f"No node with id {node_id}"
+        data = n.model_dump()
+        if name is not None: data["name"] = name or None
+        if title is not None: data["title"] = title or None
+        if role is not None: data["role"] = role or None
+        if body is not None: data["body"] = body or None
+        if age is not None: data["age"] = age or None
+        if tags is not None: data["tags"] = list(tags) if tags else None
+        node = BoardNode(**data)
+        index.replace_node(node)
+        changes.node_changed(node)
+        _save()
+        return f"Updated {node_id}"
 
     def delete_node(node_id: str) -> str:
         """Delete a node and any connections touching it."""
-        before = len(board.nodes)
-        board.nodes = [n for n in board.nodes if n.id != node_id]
-        if len(board.nodes) == before:
+        if node_id not in index:
             return f"No node with id {node_id}"
-        board.connections = [
-            c for c in board.connections if c.from_ != node_id and c.to != node_id
-        ]
+        _, dropped = index.remove_node(node_id)
+        for c in dropped:
+            changes.connection_removed(c)
+        changes.node_removed(node_id)
         _save()
         return f"Deleted {node_id}"
 
     def add_connection(from_id: str, to_id: str, label: str = "") -> str:
         """Link two nodes. Labels like 'estranged sibling' help readers."""
-        ids = {n.id for n in board.nodes}
-        if from_id not in ids or to_id not in ids:
+        if from_id not in index or to_id not in index:
             return f"Unknown node id ({from_id!r} or {to_id!r})"
-        for c in board.connections:
-            if {c.from_, c.to} == {from_id, to_id}:
-                return "Connection already exists"
-        board.connections.append(Connection(**{"from": from_id, "to": to_id, "label": label or None}))
+        if index.connection(from_id, to_id) is not None:
+            return "Connection already exists"
+        conn = Connection(**{"from": from_id, "to": to_id, "label": label or None})
+        index.link(conn)
+        changes.connection_changed(conn)
         _save()
         return f"Linked {from_id} ↔ {to_id}"
 
     def remove_connection(from_id: str, to_id: str) -> str:
         """Remove the connection between two nodes (order-independent)."""
-        before = len(board.connections)
-        board.connections = [
-            c for c in board.connections if {c.from_, c.to} != {from_id, to_id}
-        ]
-        if len(board.connections) == before:
+        conn = index.remove_connection(from_id, to_id)
+        if conn is None:
             return "No such connection"
+        changes.connection_removed(conn)
         _save()
         return f"Unlinked {from_id} ↔ {to_id}"
 
+    def get_node(node_id: str) -> str:
+        """Read one card's full details and links. Use it for cards the board view
+        only lists in its index."""
+        n = index.get(node_id)
+        if n is None:
+            return f"No node with id {node_id}"
+        links = [
+            [c.to if c.from_ == node_id else c.from_, *([c.label] if c.label else [])]
+            for c in index.connections_of(node_id)
+        ]
+        return compact_json(node_details(n, links))
+
+    def apply_board_ops(ops: list[BoardEditOp]) -> str:
+        """Apply several edits at once, in order, as one change.
+
+        Prefer this over single-edit tools whenever a request needs more than one
+        edit. ops: add (kind, ref, name/title/role/body/age/tags), update (id +
+        fields to change; "" clears), delete (id), link (from_id, to_id, label),
+        unlink (from_id, to_id). Give an add a ref like "$hero" and use it as the
+        id in later ops to link cards created in the same call. Everything is
+        validated first; if any op is invalid nothing is applied.
+        Returns one result line per op.
+        """
+        # Validate the whole batch against a simulated view of the board.
+        alive: dict[str, bool] = {}  # ids added (True) or deleted (False) so far
+        linked: dict[frozenset[str], bool] = {}
+        refs: dict[str, str] = {}
+        resolved: list[dict[str, str]] = []
+        errors: list[str] = []
+
+        def exists(node_id: str) -> bool:
+            return alive.get(node_id, node_id in index)
+
+        def has_link(a: str, b: str) -> bool:
+            key = frozenset((a, b))
+            return linked.get(key, index.connection(a, b) is not None)
+
+        for i, op in enumerate(ops):
+            ids: dict[str, str] = {}
+            try:
+                for field in ("id", "from_id", "to_id"):
+                    value = getattr(op, field)
+                    if value is None:
+                        continue
+                    if value.startswith("$"):
+                        if value not in refs:
+                            raise ValueError(f"unknown placeholder {value}")
+                        value = refs[value]
+                    if not exists(value):
+                        raise ValueError(f"no node with id {value!r}")
+                    ids[field] = value
+                if op.op == "add":
+                    if op.kind is None:
+                        raise ValueError("add needs a kind")
+                    if op.ref is not None and (not op.ref.startswith("$") or op.ref in refs):
+                        raise ValueError(f"ref must be a new placeholder starting with '$', got {op.ref!r}")
+                    ids["id"] = _new_id()
+                    alive[ids["id"]] = True
+                    if op.ref:
+                        refs[op.ref] = ids["id"]
+                elif op.op in ("update", "delete"):
+                    if "id" not in ids:
+                        raise ValueError(f"{op.op} needs an id")
+                    if op.op == "delete":
+                        alive[ids["id"]] = False
+                        for c in index.connections_of(ids["id"]):
+                            linked[frozenset((c.from_, c.to))] = False
+                        for key, on in list(linked.items()):
+                            if on and ids["id"] in key:
+                                linked[key] = False
+                else:
+                    if "from_id" not in ids or "to_id" not in ids:
+                        raise ValueError(f"{op.op} needs from_id and to_id")
+                    a, b = ids["from_id"], ids["to_id"]
+                    if op.op == "link":
+                        if a == b:
+                            raise ValueError("cannot link a node to itself")
+                        linked[frozenset((a, b))] = True
+                    else:
+                        if not has_link(a, b):
+                            raise ValueError(f"no connection between {a!r} and {b!r}")
+                        linked[frozenset((a, b))] = False
+            except ValueError as e:
+                errors.append(f"op {i} ({op.op}): {e}")
+            resolved.append(ids)
+        if errors:
+            return "No changes applied.\n" + "\n".join(errors)
+
+        results: list[str] = []
+        for i, (op, ids) in enumerate(zip(ops, resolved)):
+            fields = {k: getattr(op, k) for k in NODE_FIELDS if getattr(op, k) is not None}
+            if op.op == "add":
+                x, y = _place(index, op.kind)
+                node = BoardNode(
+                    id=ids["id"], kind=op.kind, x=x, y=y,
+                    **{k: (list(v) if k == "tags" else v) or None for k, v in fields.items()},
+                )
+                index.add_node(node)
+                changes.node_changed(node)
+                line = f"{i}: added {op.kind} {node.id}"
+                if op.ref:
+                    line += f" ({op.ref})"
+                if node.name or node.title:
+                    line += f" — {node.name or node.title}"
+                results.append(line)
+            elif op.op == "update":
+                data = index.get(ids["id"]).model_dump()
+                data.update({k: (list(v) if k == "tags" else v) or None for k, v in fields.items()})
+                node = BoardNode(**data)
+                index.replace_node(node)
+                changes.node_changed(node)
+                results.append(f"{i}: updated {node.id}")
+            elif op.op == "delete":
+                _, dropped = index.remove_node(ids["id"])
+                for c in dropped:
+                    changes.connection_removed(c)
+                changes.node_removed(ids["id"])
+                results.append(f"{i}: deleted {ids['id']}")
+            elif op.op == "link":
+                conn = Connection(**{"from": ids["from_id"], "to": ids["to_id"], "label": op.label or None})
+                index.link(conn)
+                changes.connection_changed(conn)
+                results.append(f"{i}: linked {conn.from_} ↔ {conn.to}")
+            else:
+                conn = index.remove_connection(ids["from_id"], ids["to_id"])
+                changes.connection_removed(conn)
+                results.append(f"{i}: unlinked {conn.from_} ↔ {conn.to}")
+        if ops:
+            _save()
+        return "\n".join(results) or "No ops given"
+
     funcs = [
+        get_node,
+        apply_board_ops,
         add_character, add_setting, add_tone, add_beat,
         update_node, delete_node,
         add_connection, remove_connection,
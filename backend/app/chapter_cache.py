@@ -0,0 +1,75 @@
+"""Content-addressed store for generated chapters.
+
+A chapter is keyed by a hash of everything that shaped it: the scenario minus
+the other beats, its own beat and position, the model, the temperature and the
+prompt templates. Editing one beat therefore only invalidates that chapter, and
+a generation that died halfway resumes from the chapters already on disk.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import uuid
+from pathlib import Path
+
+from .config import settings
+from .models import Scenario
+
+logger = logging.getLogger(__name__)
+
+CHAPTERS_DIR = settings.data_dir / "chapters"
+
+
+def chapter_key(
+    scenario: Scenario,
+    beat: dict,
+    index: int,
+    total: int,
+    *,
+    model: str,
+    temperature: float | None,
+    templates: tuple[str, ...],
+) -> str:
+    context = scenario.model_dump(exclude={"plot", "ready"})
+    material = {
+        "scenario": context,
+        "beat": beat,
+        "index": index,
+        "total": total,
+        "model": model,
+        "temperature": temperature,
+        "templates": templates,
+    }
+    blob = json.dumps(material, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+def _path(key: str) -> Path:
+    return CHAPTERS_DIR / key[:2] / f"{key}.txt"
+
+
+def get(key: str) -> str | None:
+    """The cached chapter, or None. An unreadable entry counts as a miss: the
+    chapter is drafted again and its `put` replaces the file."""
+    try:
+        return _path(key).read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return None
+    except (OSError, UnicodeDecodeError):
+        logger.warning("chapter cache: unreadable entry %s, drafting it again", key, exc_info=True)
+        return None
+
+
+def put(key: str, text: str) -> None:
+    p = _path(key)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    # Unique per call: two boards with identical content can write the same key at once.
+    tmp = p.with_name(f".{p.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, p)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
@@ -0,0 +1,124 @@
+"""Negotiated response compression for the JSON endpoints.
+
+Boards are mostly prose and compress about 4×, so large `GET /boards/{id}`,
+scenario and revision responses go out as brotli (when the `brotli` package is
+installed and the client accepts `br`) or gzip. Only complete JSON bodies of
+at least `compression_min_bytes` are touched; SSE streams and anything already
+encoded pass through unchanged, so streaming latency is unaffected. A
+compressed response's `ETag` is marked weak, since the bytes differ from the
+identity encoding (the board routes compare ETags weakly anyway).
+"""
+from __future__ import annotations
+
+import asyncio
+import gzip
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:  # optional: pip install brotli
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+# Level 4 gets within ~15% of level 6's size in under half the CPU time.
+GZIP_LEVEL = 4
+# Brotli's low qualities beat gzip -6 on both size and speed for JSON; the high
+# ones are for static assets.
+BROTLI_QUALITY = 4
+# Bodies at least this large are compressed on a worker thread, keeping the
+# event loop (and every live SSE stream) free while a big board is packed.
+OFFLOAD_BYTES = 64 * 1024
+
+
+def _accepted(header: str) -> set[str]:
+    """Codings in an Accept-Encoding header with a non-zero q-value."""
+    out: set[str] = set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding and q > 0:
+            out.add(coding.strip().lower())
+    return out
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    codings = _accepted(accept_encoding)
+    if brotli is not None and "br" in codings:
+        return "br"
+    if "gzip" in codings or "*" in codings:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Message | None = None
+        passthrough = False
+
+        async def wrapped(message: Message) -> None:
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if (
+                    headers.get("content-type", "").startswith("application/json")
+                    and "content-encoding" not in headers
+                ):
+                    start = message  # decide once the body is known
+                else:
+                    passthrough = True
+                    await send(message)
+                return
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                # Streamed or small: not worth it.
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+            if len(body) >= OFFLOAD_BYTES:
+                body = await asyncio.to_thread(compress, body, encoding)
+            else:
+                body = compress(body, encoding)
+            headers = MutableHeaders(raw=start["headers"])
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = "W/" + etag
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, wrapped)
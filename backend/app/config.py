@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -7,13 +8,84 @@ class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", env_prefix="SW_", extra="ignore")
 
     llm_base_url: str = "http://192.168.32.1:1234/v1"
+    # several OpenAI-compatible servers with the same model: when set, requests
+    # are balanced across these instead of going to llm_base_url
+    llm_base_urls: list[str] = []
     llm_api_key: str = "lm-studio"
     llm_model: str = ""  # empty = auto-detect via /v1/models (first non-embedding)
     llm_request_timeout: float = 60.0
+    llm_stream_usage: bool = True  # ask for token usage on streamed responses (stream_options)
+    # one keep-alive connection pool to the LLM server, shared by every request
+    llm_max_connections: int = 16
+    llm_max_keepalive: int = 8
+    llm_keepalive_s: float = 120.0  # idle pooled connections are closed after this long
+    # health-probe every server (GET /models, which also refreshes an auto-detected
+    # model) this often; 0 = only at startup
+    llm_probe_interval_s: float = 15.0
+    # with another server to fall back to, a request that has produced no output
+    # after this long is abandoned and retried there (0 = wait for llm_request_timeout)
+    llm_first_token_timeout_s: float = 30.0
+    # consecutive failures that take a server out of rotation, and for how long
+    llm_breaker_failures: int = 3
+    llm_breaker_cooldown_s: float = 30.0
+    # LLM requests in flight across the whole backend; persona turns queue ahead
+    # of chapter drafting, and the last `llm_interactive_reserve` slots are kept
+    # free of chapter drafting so the persona stays responsive
+    llm_max_concurrency: int = 2
+    llm_interactive_reserve: int = 1
+    # token budget for the board view in persona prompts: every node is always
+    # indexed, full details go in by relevance to the message until this is spent
+    persona_context_tokens: int = 4000
+    # chapters drafted at once by /generate; 1 = one after another. Later chapters
+    # are buffered and streamed in order, so the SSE protocol is unchanged.
+    story_concurrency: int = 1
+    chapter_cache: bool = True  # replay unchanged chapters from data/chapters
+
+    # SSE framing: consecutive tokens are merged for up to this long / this many
+    # characters before a frame is written (0 ms = one frame per token)
+    sse_coalesce_ms: float = 40.0
+    sse_coalesce_bytes: int = 2048
+    sse_heartbeat_s: float = 15.0  # ": ping" comment after this much silence; 0 disables
+    job_retention_s: float = 600.0  # finished generation jobs stay replayable this long
+    # a job left without readers is cancelled after this long (0 = immediately)
+    job_orphan_grace_s: float = 5.0
 
     data_dir: Path = Path(__file__).resolve().parent.parent / "data"
+    storage: Literal["json", "sqlite"] = "json"  # board storage backend
+    board_cache_size: int = 128  # parsed boards kept in memory; 0 disables the cache
+    # on-disk encoding for newly written boards; all three are readable regardless
+    board_format: Literal["pretty", "compact", "gzip"] = "pretty"
+    revision_history: bool = True  # append a delta per save under data/revisions
+    revision_checkpoint_interval: int = 50  # full snapshot every N revisions
 
     cors_origins: list[str] = ["http://localhost:5173"]
+    # gzip / brotli for JSON responses of at least this many bytes (SSE is never compressed)
+    compression: bool = True
+    compression_min_bytes: int = 1024
+
+    log_level: str = "INFO"  # level for the app.* loggers
+
+    # how often the event-loop lag probe (GET /stats -> event_loop) wakes; 0 disables
+    loop_lag_interval_ms: float = 100.0
+    metrics: bool = True  # GET /metrics (Prometheus); off = instruments are no-ops and the route 404s
+    # per-request spans for streams, LLM calls, tools and saves: off, log (JSON
+    # lines on app.trace) or otel (OpenTelemetry tracer)
+    tracing: Literal["off", "log", "otel"] = "off"
+    # > 0 turns on asyncio debug mode and logs every callback that holds the
+    # event loop longer than this many milliseconds
+    debug_slow_callback_ms: float = 0.0
+
+    @property
+    def llm_urls(self) -> list[str]:
+        return self.llm_base_urls or [self.llm_base_url]
+
+    @property
+    def boards_dir(self) -> Path:
+        return self.data_dir / "boards"
+
+    @property
+    def sqlite_path(self) -> Path:
+        return self.data_dir / "storywriter.db"
 
     @property
     def files_dir(self) -> Path:
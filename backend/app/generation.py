@@ -1,72 +1,218 @@
-import json
+import asyncio
+import logging
 from collections.abc import AsyncIterator
+from time import monotonic, perf_counter
 
 from langchain_core.messages import AIMessageChunk, HumanMessage, SystemMessage, ToolMessage
 
-from . import storage
+from . import chapter_cache, metrics, storage, tracing
+from .board_context import approx_tokens, build_board_context, compact_json
+from .board_ops import BoardChanges, apply_patch
 from .board_tools import build_board_tools
+from .config import settings
+from .indexed_board import IndexedBoard
 from .llm import writer_llm
 from .models import Board
 from .scenario import build_scenario
+from .scheduler import BATCH, INTERACTIVE, scheduler
+
+logger = logging.getLogger(__name__)
 
 CHAPTER_COUNT = 5
+# ~500 words of prose; used to estimate the output an aborted chapter didn't need
+CHAPTER_TOKEN_ESTIMATE = 700
+
+# Streams whose reader went away mid-generation; see abort_stats().
+_abort_stats = {"story_aborted": 0, "persona_aborted": 0, "chapters_skipped": 0, "tokens_saved_estimate": 0}
 
 CHAPTER_SYSTEM = """You are the Writer for the StoryWriter app. You receive a scenario assembled
 from the user's board (characters, world, tone, plot beats) and draft a single chapter at a time
 in literary prose. Match the requested tone. Use paragraphs separated by blank lines. Do not write
 chapter headings — those are added by the system. Do not narrate meta. Just the chapter prose."""
 
+# The scenario rides in the system message, so every chapter request of a run
+# shares a byte-identical prefix the inference server can reuse (KV/prefix
+# cache); only the short per-chapter instruction at the end differs.
+CHAPTER_CONTEXT = """{system}
+
+Scenario JSON:
+{scenario}"""
+
+CHAPTER_PROMPT = """Write Chapter {index} of {total}, focused on the beat: {beat!r}. Roughly 400-600 words. Stay in tone."""
+
+
+def abort_stats() -> dict[str, int]:
+    return dict(_abort_stats)
+
+
+def _report_prompt(label: str, kind: str, prefix: str, suffix: str, usage: dict | None) -> int:
+    shared, specific = approx_tokens(prefix), approx_tokens(suffix)
+    metrics.PROMPT_TOKENS.observe(shared + specific, kind=kind)
+    line = (
+        f"{label}: prompt ~{shared + specific} tokens "
+        f"(shared prefix ~{shared}, request-specific ~{specific})"
+    )
+    if usage:
+        cached = (usage.get("input_token_details") or {}).get("cache_read")
+        line += f"; server: input={usage.get('input_tokens')} output={usage.get('output_tokens')}"
+        if cached is not None:
+            line += f" cached={cached}"
+    logger.info(line)
+    return shared + specific
+
+
+def _observe_llm(kind: str, started: float, first: float | None, ended: float, tokens: int) -> dict:
+    """Record one LLM stream's latency and rate; returns them as span attributes."""
+    metrics.LLM_DURATION.observe(ended - started, kind=kind)
+    metrics.LLM_OUTPUT_TOKENS.inc(tokens, kind=kind)
+    attrs = {"duration_ms": round(1000 * (ended - started), 1), "output_tokens": tokens}
+    if first is not None:
+        metrics.LLM_TTFT.observe(first - started, kind=kind)
+        attrs["ttft_ms"] = round(1000 * (first - started), 1)
+        if tokens and ended > first:
+            metrics.LLM_TOKENS_PER_S.observe(tokens / (ended - first), kind=kind)
+            attrs["tokens_per_s"] = round(tokens / (ended - first), 1)
+    return attrs
 
-def _sse(payload: dict) -> bytes:
-    return f"data: {json.dumps(payload)}\n\n".encode()
 
+async def stream_story(board: Board, *, force: bool = False) -> AsyncIterator[dict]:
+    """Stream the book chapter by chapter as event dicts (framed by `sse.frames`).
 
-async def stream_story(board: Board) -> AsyncIterator[bytes]:
+    Chapters found in the chapter cache are replayed from disk instead of being
+    drafted again; `force` skips the lookup (fresh drafts still refill the cache).
+    """
     scenario = build_scenario(board)
     if not scenario.characters:
-        yield _sse({
+        yield {
             "type": "chapter_start",
             "chapter": {"num": "—", "title": "Board is empty"},
-        })
-        yield _sse({
+        }
+        yield {
             "type": "token",
             "content": "Add at least one character and one plot beat on the board, then try again.",
-        })
-        yield _sse({"type": "done"})
+        }
+        yield {"type": "done"}
         return
 
     llm = writer_llm()
     beats = scenario.plot["beats"]
     plan = beats if beats else [{"title": f"Chapter {i + 1}"} for i in range(CHAPTER_COUNT)]
 
+    system = CHAPTER_CONTEXT.format(
+        system=CHAPTER_SYSTEM, scenario=compact_json(scenario.model_dump()),
+    )
+    chapters = []
     for idx, beat in enumerate(plan, start=1):
         title = beat.get("title") or f"Chapter {idx}"
         description = beat.get("description") or ""
         roman = ["I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X"][idx - 1] if idx <= 10 else str(idx)
-        yield _sse({
-            "type": "chapter_start",
-            "chapter": {"num": f"CHAPTER {roman}", "title": title},
-        })
-
         beat_line = f"{title} — {description}" if description else title
-        prompt = (
-            f"Scenario JSON:\n{scenario.model_dump_json(indent=2)}\n\n"
-            f"Write Chapter {idx} of {len(plan)}, focused on the beat: {beat_line!r}. "
-            f"Roughly 400-600 words. Stay in tone."
-        )
-        messages = [SystemMessage(content=CHAPTER_SYSTEM), HumanMessage(content=prompt)]
+        prompt = CHAPTER_PROMPT.format(index=idx, total=len(plan), beat=beat_line)
+        messages = [SystemMessage(content=system), HumanMessage(content=prompt)]
+        key = None
+        if settings.chapter_cache:
+            key = chapter_cache.chapter_key(
+                scenario, beat, idx, len(plan),
+                model=llm.model_name, temperature=llm.temperature,
+                templates=(CHAPTER_SYSTEM, CHAPTER_CONTEXT, CHAPTER_PROMPT),
+            )
+        chapters.append(({"num": f"CHAPTER {roman}", "title": title}, messages, key))
+
+    # Every chapter gets a buffer and a drafting task; the semaphore caps how many
+    # talk to the LLM at once. We stream buffers strictly in order, so chapter I
+    # reaches the client live while later ones fill up behind it.
+    limit = asyncio.Semaphore(max(1, settings.story_concurrency))
+    buffers: list[asyncio.Queue] = [asyncio.Queue() for _ in chapters]
+    streamed = [0] * len(chapters)  # chunks received per chapter
+    drafted = [False] * len(chapters)
+    trace = tracing.start_span("story", board=board.id, chapters=len(chapters))
+
+    # Look every chapter up before any drafting starts: the drafting tasks must
+    # reach the semaphore in chapter order, which an await ahead of it would
+    # scramble (chapter I could end up queued behind later ones).
+    keys = [k if not force else None for _, _, k in chapters]
+    hits = await asyncio.to_thread(lambda: [chapter_cache.get(k) if k else None for k in keys])
+
+    async def draft(i: int, messages: list, key: str | None, cached: str | None, out: asyncio.Queue) -> None:
         try:
-            async for chunk in llm.astream(messages):
-                if chunk.content:
-                    yield _sse({"type": "token", "content": chunk.content})
-            yield _sse({"type": "token", "content": "\n\n"})
+            with trace.child("chapter", index=i + 1) as span:
+                if cached is not None:
+                    metrics.CHAPTERS.inc(source="cache")
+                    span.set(cached=True)
+                    out.put_nowait(cached)
+                else:
+                    parts: list[str] = []
+                    usage = None
+                    queued = monotonic()
+                    async with limit, scheduler.slot(BATCH, board.id):
+                        started = monotonic()
+                        first = None
+                        async for chunk in llm.astream(messages):
+                            if chunk.content:
+                                if first is None:
+                                    first = monotonic()
+                                streamed[i] += 1
+                                parts.append(chunk.content)
+                                out.put_nowait(chunk.content)
+                            usage = chunk.usage_metadata or usage
+                        ended = monotonic()
+                    metrics.CHAPTERS.inc(source="llm")
+                    prompt = _report_prompt(
+                        f"board {board.id} chapter", "chapter", messages[0].content, messages[1].content, usage,
+                    )
+                    tokens = (usage or {}).get("output_tokens") or streamed[i]
+                    span.set(
+                        queued_ms=round(1000 * (started - queued), 1), prompt_tokens=prompt,
+                        **_observe_llm("chapter", started, first, ended, tokens),
+                    )
+                    if key:
+                        try:
+                            await asyncio.to_thread(chapter_cache.put, key, "".join(parts))
+                        except OSError:
+                            # The chapter has streamed already; only the replay copy is lost.
+                            logger.exception("board %s: could not cache chapter %d", board.id, i + 1)
+            drafted[i] = True
         except Exception as e:
-            yield _sse({"type": "token", "content": f"\n\n[error: {e}]\n\n"})
-            break
+            out.put_nowait(e)
+        out.put_nowait(None)
 
-        yield _sse({"type": "chapter_end"})
+    tasks = [
+        asyncio.create_task(draft(i, m, k, hit, q))
+        for i, ((_, m, k), hit, q) in enumerate(zip(chapters, hits, buffers))
+    ]
+    completed = False
+    try:
+        for (header, _, _), buffer in zip(chapters, buffers):
+            yield {"type": "chapter_start", "chapter": header}
+            failed = False
+            while (item := await buffer.get()) is not None:
+                if isinstance(item, Exception):
+                    yield {"type": "token", "content": f"\n\n[error: {item}]\n\n"}
+                    failed = True
+                    break
+                yield {"type": "token", "content": item}
+            if failed:
+                break
+            yield {"type": "token", "content": "\n\n"}
+            yield {"type": "chapter_end"}
+        completed = True
+    finally:
+        # Also reached when the consumer is cancelled or closes us early (the
+        # reader left): cancelling the tasks aborts the in-flight LLM requests
+        # and drops the rest of the chapter plan.
+        for t in tasks:
+            t.cancel()
+        trace.set(aborted=not completed)
+        trace.end()
+        if not completed:
+            skipped = [i for i, done in enumerate(drafted) if not done]
+            _abort_stats["story_aborted"] += 1
+            _abort_stats["chapters_skipped"] += len(skipped)
+            _abort_stats["tokens_saved_estimate"] += sum(
+                max(0, CHAPTER_TOKEN_ESTIMATE - streamed[i]) for i in skipped
+            )
 
-    yield _sse({"type": "done"})
+    yield {"type": "done"}
 
 
 PERSONA_SYSTEM = """You are {name}, the user's story companion in the StoryWriter app.
@@ -76,81 +222,206 @@ Be brief, warm, concrete. Suggest one or two specific moves at a time. Do not le
 You have tools that can edit the board (add/update/delete character, setting, tone, or
 beat cards, and link cards together). Use them ONLY when the user asks you to change
 the board — otherwise just discuss ideas. When you do edit, make the smallest change
-the user asked for, then confirm briefly in chat."""
+the user asked for, then confirm briefly in chat. When a request needs several edits,
+make them in a single apply_board_ops call.
+
+The board view lists every card in "index" as [id, label] grouped by kind; "details" holds the
+full cards most relevant to this message. Call get_node for any card you need that
+is not in "details"."""
 
 MAX_TOOL_ITERATIONS = 6
+SAVE_ATTEMPTS = 3
 
 
-def _board_view(board: Board) -> str:
-    """Compact JSON view with IDs so the LLM can reference nodes in tool calls."""
-    nodes = [
-        {k: v for k, v in n.model_dump().items() if v not in (None, [], "")}
-        for n in board.nodes
-    ]
-    conns = [
-        {k: v for k, v in c.model_dump(by_alias=True).items() if v is not None}
-        for c in board.connections
-    ]
-    return json.dumps({"title": board.title, "nodes": nodes, "connections": conns}, indent=2)
+def _drop_orphaned(changes: BoardChanges, current: Board, known: set[str]) -> list[str]:
+    """Remove edits to cards that were deleted from `current` by someone else.
+
+    Node entries in a patch are upserts, so replaying an edit to a card the
+    editor deleted meanwhile would bring it back. Cards in `known` (present
+    when the turn started) that are gone now lose their edits, and so do
+    links that would point at them; cards the persona created itself stay.
+    Returns what was dropped, as node ids and "a-b" link pairs.
+    """
+    present = {n.id for n in current.nodes}
+    dropped = [node_id for node_id in changes.nodes if node_id in known and node_id not in present]
+    for node_id in dropped:
+        del changes.nodes[node_id]
+    alive = (present | changes.nodes.keys()) - changes.removed_nodes
+    for key, c in list(changes.connections.items()):
+        if c.from_ not in alive or c.to not in alive:
+            del changes.connections[key]
+            dropped.append(f"{c.from_}-{c.to}")
+    return dropped
+
+
+def _save_edits(index: IndexedBoard, changes: BoardChanges, known: set[str]) -> tuple[int, list[str]]:
+    """Save the persona's edits without clobbering anyone else's; returns the
+    version they were saved over and any edits that had to be dropped.
 
+    The save is conditional on the version the turn last saw. If the board was
+    saved in the meantime (a PATCH from the editor, another tab), the edits
+    since the last save are replayed onto the current board, the index is
+    rebased onto it, and the save is retried. Edits to cards deleted in the
+    meantime are dropped rather than resurrecting them (see _drop_orphaned;
+    `known` holds the card ids the turn started with). `changes` is pruned to
+    match, so it still describes what was saved.
+    """
+    board = index.sync()
+    dropped: list[str] = []
+    attempts = 1
+    while True:
+        base = board.version
+        try:
+            storage.save_board(board, expected_version=base)
+            return base, dropped
+        except storage.VersionConflict:
+            current = storage.get_board(board.id)
+            if current is None or attempts >= SAVE_ATTEMPTS:
+                raise
+            attempts += 1
+            dropped += _drop_orphaned(changes, current, known)
+            board = apply_patch(current, changes.as_patch())
+            # A card the other edit deleted takes the persona's links to it along.
+            ids = {n.id for n in board.nodes}
+            board.connections = [c for c in board.connections if c.from_ in ids and c.to in ids]
+            index.rebase(board)
+
+
+async def stream_persona(board: Board, message: str, *, snapshot: bool = False) -> AsyncIterator[dict]:
+    """Chat with the persona, letting it edit `board` through tools.
 
-async def stream_persona(board: Board, message: str) -> AsyncIterator[bytes]:
+    Each save is announced as `board_updated` carrying only the patch from
+    `baseVersion` to `version`; the full board rides along on the first one
+    when `snapshot` is set (the client asked, or it is out of sync).
+    """
+    # Write-behind: tools only mark the board dirty; it is saved once per tool
+    # iteration (and on the way out if a turn dies mid-iteration).
     board_dirty = False
+    changes = BoardChanges()
+    saving: asyncio.Future | None = None  # the save in flight, if any
 
     def persist(b: Board) -> None:
         nonlocal board_dirty
-        storage.save_board(b)
         board_dirty = True
 
-    tools = build_board_tools(board, persist)
+    index = IndexedBoard(board)
+    known = set(index.nodes)
+    tools = build_board_tools(index, persist, changes)
     tools_by_name = {t.name: t for t in tools}
-    llm = writer_llm().bind_tools(tools)
+    llm = writer_llm(tools=tools)
 
     system = PERSONA_SYSTEM.format(name=board.personaName)
     context = (
-        f"Current board (use these ids when editing):\n{_board_view(board)}\n\n"
+        f"Current board (use these ids when editing):\n"
+        f"{build_board_context(board, message, settings.persona_context_tokens)}\n\n"
         f"User says: {message}"
     )
     messages = [SystemMessage(content=system), HumanMessage(content=context)]
+    trace = tracing.start_span("persona", board=board.id, message_chars=len(message))
 
+    completed = False
     try:
-        for _ in range(MAX_TOOL_ITERATIONS):
+        for iteration in range(MAX_TOOL_ITERATIONS):
             accumulated: AIMessageChunk | None = None
-            async for chunk in llm.astream(messages):
-                if chunk.content:
-                    text = chunk.content if isinstance(chunk.content, str) else str(chunk.content)
-                    if text:
-                        yield _sse({"type": "token", "content": text})
-                accumulated = chunk if accumulated is None else accumulated + chunk
-
-            if accumulated is None:
-                break
+            prompt_prefix = "".join(str(m.content) for m in messages[:-1])
+            outputs = 0
+            with trace.child("llm", iteration=iteration) as span:
+                async with scheduler.slot(INTERACTIVE, board.id):
+                    started = monotonic()
+                    first = None
+                    async for chunk in llm.astream(messages):
+                        if chunk.content or chunk.tool_call_chunks:
+                            outputs += 1
+                            if first is None:
+                                first = monotonic()
+                        if chunk.content:
+                            text = chunk.content if isinstance(chunk.content, str) else str(chunk.content)
+                            if text:
+                                yield {"type": "token", "content": text}
+                        accumulated = chunk if accumulated is None else accumulated + chunk
+                    ended = monotonic()
+                if accumulated is None:
+                    break
+                prompt = _report_prompt(
+                    f"board {board.id} persona", "persona", prompt_prefix, str(messages[-1].content),
+                    accumulated.usage_metadata,
+                )
+                tool_calls = getattr(accumulated, "tool_calls", None) or []
+                tokens = (accumulated.usage_metadata or {}).get("output_tokens") or outputs
+                span.set(
+                    prompt_tokens=prompt, tool_calls=len(tool_calls),
+                    **_observe_llm("persona", started, first, ended, tokens),
+                )
             messages.append(accumulated)
-
-            tool_calls = getattr(accumulated, "tool_calls", None) or []
             if not tool_calls:
                 break
 
             for tc in tool_calls:
                 name = tc.get("name", "")
                 args = tc.get("args", {}) or {}
-                yield _sse({"type": "tool_start", "name": name, "input": args})
+                yield {"type": "tool_start", "name": name, "input": args}
                 fn = tools_by_name.get(name)
-                if fn is None:
-                    result = f"Unknown tool: {name}"
-                else:
-                    try:
-                        result = fn.invoke(args)
-                    except Exception as e:
-                        result = f"Error: {e}"
+                label, outcome = (name, "ok") if fn is not None else ("unknown", "unknown")
+                with trace.child("tool", tool=name) as tool_span:
+                    tool_started = perf_counter()
+                    if fn is None:
+                        result = f"Unknown tool: {name}"
+                    else:
+                        try:
+                            result = fn.invoke(args)
+                        except Exception as e:
+                            result = f"Error: {e}"
+                            outcome = "error"
+                            tool_span.set(error=str(e))
+                    metrics.TOOL_SECONDS.observe(perf_counter() - tool_started, tool=label)
+                    metrics.TOOL_CALLS.inc(tool=label, outcome=outcome)
                 result_str = str(result)
-                yield _sse({"type": "tool_end", "name": name, "output": result_str})
+                yield {"type": "tool_end", "name": name, "output": result_str}
                 messages.append(ToolMessage(content=result_str, tool_call_id=tc.get("id", "")))
 
             if board_dirty:
-                yield _sse({"type": "board_updated", "board": json.loads(board.model_dump_json(by_alias=True))})
+                with trace.child("save") as span:
+                    # Shielded: a reader leaving mid-save cancels this await, not
+                    # the save; the cleanup below waits for it instead.
+                    saving = asyncio.ensure_future(asyncio.to_thread(_save_edits, index, changes, known))
+                    base_version, dropped = await asyncio.shield(saving)
+                    span.set(base_version=base_version, dropped=len(dropped))
                 board_dirty = False
+                if dropped:
+                    logger.info("board %s: dropped persona edits to deleted cards: %s", board.id, dropped)
+                saved = index.board
+                event = {
+                    "type": "board_updated",
+                    "baseVersion": base_version,
+                    "version": saved.version,
+                    "updatedAt": saved.updatedAt,
+                    "patch": changes.as_patch(),
+                }
+                if dropped:
+                    event["dropped"] = dropped
+                changes.clear()
+                if snapshot:
+                    event["board"] = saved.model_dump(mode="json", by_alias=True)
+                    snapshot = False
+                yield event
+        completed = True
     except Exception as e:
-        yield _sse({"type": "token", "content": f"[error: {e}]"})
+        completed = True
+        yield {"type": "token", "content": f"[error: {e}]"}
+    finally:
+        trace.set(aborted=not completed)
+        trace.end()
+        if not completed:
+            _abort_stats["persona_aborted"] += 1
+        # Never save on the loop thread. A save cut short by cancellation is
+        # still running in its thread: wait for it rather than starting another.
+        try:
+            if saving is not None and not saving.done():
+                await asyncio.shield(saving)
+                board_dirty = False
+            if board_dirty:
+                await asyncio.shield(asyncio.to_thread(_save_edits, index, changes, known))
+        except Exception:
+            logger.exception("board %s: could not save the persona's last edits", board.id)
 
-    yield _sse({"type": "done"})
+    yield {"type": "done"}
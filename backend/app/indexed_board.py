@@ -0,0 +1,144 @@
+"""Indexed, mutable view of a Board for code that edits or queries it a lot.
+
+`Board` keeps nodes and connections in plain lists, so every lookup by id is a
+scan. `IndexedBoard` holds the same data in insertion-ordered dicts: nodes by
+id (and by kind), connections by unordered endpoint pair, plus per-node
+adjacency and the rightmost x per kind used for lane placement. Lookups, edits
+and deletes are O(1) (deleting a node is O(its degree)), and `to_board` /
+`sync` give back a `Board` with the same node and connection order that plain
+list edits would have produced. Like board_ops, it treats connections as unique
+per unordered pair of endpoints.
+"""
+from __future__ import annotations
+
+from collections.abc import Iterator
+
+from .board_ops import pair
+from .models import Board, BoardNode, Connection
+
+
+class IndexedBoard:
+    def __init__(self, board: Board) -> None:
+        self.rebase(board)
+
+    def rebase(self, board: Board) -> None:
+        """Re-index onto `board`, dropping any unsynced edits (callers holding
+        this object, like the board tools, see the new board from now on)."""
+        self.board = board
+        self.nodes: dict[str, BoardNode] = {}
+        self._by_kind: dict[str, dict[str, BoardNode]] = {}
+        self.connections: dict[frozenset[str], Connection] = {}
+        self._adjacent: dict[str, set[frozenset[str]]] = {}
+        # kind -> rightmost x, or None when a delete left it to be recomputed
+        self._rightmost: dict[str, float | None] = {}
+        self.dirty = False
+        for n in board.nodes:
+            self._index_node(n)
+        for c in board.connections:
+            key = pair(c.from_, c.to)
+            self.connections[key] = c
+            for end in key:
+                self._adjacent.setdefault(end, set()).add(key)
+
+    def _index_node(self, node: BoardNode) -> None:
+        self.nodes[node.id] = node
+        self._by_kind.setdefault(node.kind, {})[node.id] = node
+        self._adjacent.setdefault(node.id, set())
+        right = self._rightmost.get(node.kind, float("-inf"))
+        if right is not None and node.x > right:
+            self._rightmost[node.kind] = node.x
+
+    # -- queries ---------------------------------------------------------
+
+    def get(self, node_id: str) -> BoardNode | None:
+        return self.nodes.get(node_id)
+
+    def __contains__(self, node_id: str) -> bool:
+        return node_id in self.nodes
+
+    def of_kind(self, kind: str) -> list[BoardNode]:
+        """Nodes of one kind, in board order."""
+        return list(self._by_kind.get(kind, {}).values())
+
+    def rightmost_x(self, kind: str) -> float | None:
+        """Largest x among nodes of `kind`, or None if there are none."""
+        nodes = self._by_kind.get(kind)
+        if not nodes:
+            return None
+        if self._rightmost.get(kind) is None:
+            self._rightmost[kind] = max(n.x for n in nodes.values())
+        return self._rightmost[kind]
+
+    def connection(self, a: str, b: str) -> Connection | None:
+        return self.connections.get(pair(a, b))
+
+    def connections_of(self, node_id: str) -> Iterator[Connection]:
+        for key in self._adjacent.get(node_id, ()):
+            yield self.connections[key]
+
+    # -- edits -----------------------------------------------------------
+
+    def add_node(self, node: BoardNode) -> None:
+        if node.id in self.nodes:
+            raise ValueError(f"node id {node.id!r} already exists")
+        self._index_node(node)
+        self.dirty = True
+
+    def replace_node(self, node: BoardNode) -> None:
+        """Swap in a new version of an existing node, keeping its position."""
+        old = self.nodes[node.id]
+        self.nodes[node.id] = node
+        if old.kind != node.kind:
+            del self._by_kind[old.kind][node.id]
+            self._by_kind.setdefault(node.kind, {})
+        self._by_kind[node.kind][node.id] = node
+        if old.kind != node.kind or node.x < old.x:
+            self._rightmost[old.kind] = None
+        right = self._rightmost.get(node.kind, float("-inf"))
+        if right is not None and node.x > right:
+            self._rightmost[node.kind] = node.x
+        self.dirty = True
+
+    def remove_node(self, node_id: str) -> tuple[BoardNode, list[Connection]]:
+        """Delete a node and its connections; returns both."""
+        node = self.nodes.pop(node_id)
+        del self._by_kind[node.kind][node_id]
+        if self._rightmost.get(node.kind) == node.x:
+            self._rightmost[node.kind] = None
+        removed = [self.remove_connection(*key) for key in list(self._adjacent.pop(node_id, ()))]
+        self.dirty = True
+        return node, [c for c in removed if c is not None]
+
+    def link(self, conn: Connection) -> None:
+        """Add a connection, or replace the one between the same two nodes."""
+        key = pair(conn.from_, conn.to)
+        self.connections[key] = conn
+        for end in key:
+            self._adjacent.setdefault(end, set()).add(key)
+        self.dirty = True
+
+    def remove_connection(self, a: str, b: str | None = None) -> Connection | None:
+        key = pair(a, a if b is None else b)
+        conn = self.connections.pop(key, None)
+        if conn is not None:
+            for end in key:
+                self._adjacent.get(end, set()).discard(key)
+            self.dirty = True
+        return conn
+
+    # -- back to the model -------------------------------------------------
+
+    def sync(self) -> Board:
+        """Write pending edits back into the wrapped Board and return it."""
+        if self.dirty:
+            self.board.nodes = list(self.nodes.values())
+            self.board.connections = list(self.connections.values())
+            self.dirty = False
+        return self.board
+
+    def to_board(self) -> Board:
+        """A separate Board with the current contents."""
+        return self.board.model_copy(update={
+            "nodes": list(self.nodes.values()),
+            "connections": list(self.connections.values()),
+        })
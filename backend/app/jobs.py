@@ -0,0 +1,169 @@
+"""Story generations as background jobs.
+
+A job owns one `stream_story` run and appends every event it produces to an
+in-memory log, numbered from 1. HTTP requests never drive the generator
+themselves: they follow the log from some position, so a reader who reloads
+the page picks up where it left off (`Last-Event-ID`), and everyone watching
+the same board shares a single upstream LLM stream. Finished jobs stay around
+for `job_retention_s` so late reconnects can still replay them.
+
+A job nobody follows any more is given `job_orphan_grace_s` for the reader to
+come back (a page reload); after that it is cancelled, which aborts the
+in-flight LLM request and the rest of the chapter plan.
+"""
+from __future__ import annotations
+
+import asyncio
+import uuid
+from collections.abc import AsyncIterator
+from datetime import datetime, timezone
+from time import monotonic
+
+from .config import settings
+from .generation import stream_story
+from .models import Board, JobInfo
+
+
+class GenerationJob:
+    def __init__(self, board: Board, *, force: bool) -> None:
+        self.id = uuid.uuid4().hex[:12]
+        self.board_id = board.id
+        # what the run was started from (stream_story doesn't mutate it); dropped when it finishes
+        self.board: Board | None = board
+        self.created_at = datetime.now(timezone.utc).isoformat()
+        self.events: list[dict] = []
+        self.status = "running"
+        self.finished_at: float | None = None
+        self.followers = 0
+        self._reaper: asyncio.TimerHandle | None = None
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run(board, force))
+        self._task.add_done_callback(self._close)
+
+    async def _run(self, board: Board, force: bool) -> None:
+        try:
+            async for event in stream_story(board, force=force):
+                self._append(event)
+            self.status = "done"
+        except asyncio.CancelledError:
+            self.status = "cancelled"
+            self._append({"type": "token", "content": "\n\n[generation cancelled]\n\n"})
+            self._append({"type": "done"})
+        except Exception as e:
+            self.status = "failed"
+            self._append({"type": "token", "content": f"\n\n[error: {e}]\n\n"})
+            self._append({"type": "done"})
+        finally:
+            self._close()
+
+    def _close(self, _task: asyncio.Task | None = None) -> None:
+        if self.finished_at is None:
+            if self.status == "running":  # cancelled before it ever ran
+                self.status = "cancelled"
+            self.finished_at = monotonic()
+            self._wake.set()
+            # Only unfinished jobs are joined; the event log stays in _jobs for replay.
+            if _running.get(self.board_id) is self:
+                del _running[self.board_id]
+            self.board = None
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+
+    def _append(self, event: dict) -> None:
+        self.events.append(event)
+        # Wake every follower, then arm a fresh event for the next append.
+        self._wake.set()
+        self._wake = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+    def cancel(self) -> None:
+        self._task.cancel()
+
+    async def follow(self, after: int = 0) -> AsyncIterator[dict]:
+        """Events numbered > `after`, live until the job ends. Each carries its
+        sequence number under "id" (picked up by `sse.frames`)."""
+        pos = max(0, after)
+        self.followers += 1
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        try:
+            while True:
+                wake = self._wake
+                while pos < len(self.events):
+                    pos += 1
+                    yield {**self.events[pos - 1], "id": pos}
+                if self.finished:
+                    return
+                await wake.wait()
+        finally:
+            self.followers -= 1
+            if not self.followers and not self.finished:
+                grace = settings.job_orphan_grace_s
+                if grace > 0:
+                    self._reaper = asyncio.get_running_loop().call_later(grace, self._reap)
+                else:
+                    self._reap()
+
+    def _reap(self) -> None:
+        self._reaper = None
+        if not self.followers and not self.finished:
+            self.cancel()
+
+    def info(self) -> JobInfo:
+        return JobInfo(
+            id=self.id,
+            boardId=self.board_id,
+            status=self.status,
+            events=len(self.events),
+            createdAt=self.created_at,
+        )
+
+
+_jobs: dict[str, GenerationJob] = {}
+_running: dict[str, GenerationJob] = {}  # board id -> its unfinished job
+
+
+def _evict() -> None:
+    cutoff = monotonic() - settings.job_retention_s
+    for job_id in [j.id for j in _jobs.values() if j.finished and j.finished_at < cutoff]:
+        del _jobs[job_id]
+
+
+def start(board: Board, *, force: bool = False) -> GenerationJob:
+    """The board's running job if it was started from this same board, else a
+    new job for `board`.
+
+    A running job for an older state of the board (edited since, by version or
+    by hand), or any running job when `force` is set, is cancelled and replaced.
+    """
+    _evict()
+    job = _running.get(board.id)
+    if job is not None and not job.finished:
+        if not force and job.board == board:
+            return job
+        job.cancel()
+    job = GenerationJob(board, force=force)
+    _jobs[job.id] = job
+    _running[board.id] = job
+    return job
+
+
+def get(job_id: str) -> GenerationJob | None:
+    _evict()
+    return _jobs.get(job_id)
+
+
+def running_for(board_id: str) -> GenerationJob | None:
+    job = _running.get(board_id)
+    return job if job is not None and not job.finished else None
+
+
+def cancel_all() -> None:
+    for job in _jobs.values():
+        if not job.finished:
+            job.cancel()
@@ -1,46 +1,187 @@
+"""The LLM client side: one pooled HTTP client, cached chat models, model discovery.
+
+Every `ChatOpenAI` shares a single `httpx.AsyncClient`, so connections to the
+inference servers (and any proxy / TLS in front of them) are kept alive
+between requests instead of being set up again for each chapter and persona
+turn. Chat models are cached per (server, model, temperature, streaming) and,
+with tools bound, per tool set, so tool schemas are converted once rather than
+per turn. `writer_llm()` hands out a `RoutedLLM`, which sends each request to
+a server picked by the router (app/router.py).
+
+The servers are health-probed through `/v1/models` at startup and every
+`llm_probe_interval_s`; with `llm_model` unset, the same probe picks the model.
+Request handlers only ever read the last result and never wait on a server.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import AsyncIterator, Sequence
+
 import httpx
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import Runnable
+from langchain_core.tools import BaseTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
 from langchain_openai import ChatOpenAI
 
 from .config import settings
+from .router import router
+
+logger = logging.getLogger(__name__)
+
+FALLBACK_MODEL = "local-model"
 
 _resolved_model: str | None = None
+_probe_task: asyncio.Task | None = None
 
+# The pooled client belongs to the event loop it was created on.
+_client: httpx.AsyncClient | None = None
+_client_loop: asyncio.AbstractEventLoop | None = None
+_llms: dict[tuple, ChatOpenAI] = {}
+_bound: dict[tuple, Runnable] = {}
 
-def _resolve_model() -> str:
-    global _resolved_model
-    if _resolved_model:
-        return _resolved_model
-    if settings.llm_model:
-        _resolved_model = settings.llm_model
-        return _resolved_model
+
+def _pick_model(ids: list[str]) -> str | None:
+    chat = [m for m in ids if "embed" not in m.lower()]
+    return chat[0] if chat else None
+
+
+def http_client() -> httpx.AsyncClient:
+    """The shared, keep-alive HTTP client for talking to the LLM servers."""
+    global _client, _client_loop
     try:
-        r = httpx.get(
-            f"{settings.llm_base_url.rstrip('/')}/models",
-            headers={"Authorization": f"Bearer {settings.llm_api_key}"},
-            timeout=5.0,
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    if _client is None or _client.is_closed or (loop is not None and loop is not _client_loop):
+        _client = httpx.AsyncClient(
+            timeout=settings.llm_request_timeout,
+            limits=httpx.Limits(
+                max_connections=settings.llm_max_connections,
+                max_keepalive_connections=settings.llm_max_keepalive,
+                keepalive_expiry=settings.llm_keepalive_s,
+            ),
         )
-        r.raise_for_status()
-        ids = [m["id"] for m in r.json().get("data", [])]
-        chat = [m for m in ids if "embed" not in m.lower()]
-        if chat:
-            _resolved_model = chat[0]
-            return _resolved_model
-    except Exception:
-        pass
-    _resolved_model = "local-model"
-    return _resolved_model
-
-
-def writer_llm(*, temperature: float = 0.85, streaming: bool = True) -> ChatOpenAI:
-    return ChatOpenAI(
-        base_url=settings.llm_base_url,
-        api_key=settings.llm_api_key,
-        model=_resolve_model(),
-        streaming=streaming,
-        temperature=temperature,
-        timeout=settings.llm_request_timeout,
+        _client_loop = loop
+        # Models hold on to the client they were built with.
+        _llms.clear()
+        _bound.clear()
+    return _client
+
+
+async def refresh_model() -> str:
+    """Probe every server; with `llm_model` unset, take the model from the
+    first healthy one (keeping the previous choice if none answers)."""
+    global _resolved_model
+    await router.probe(http_client())
+    if settings.llm_model:
+        return settings.llm_model
+    picked = next(
+        (m for b in router.backends if b.healthy and (m := _pick_model(b.models))), None,
     )
+    if picked and picked != _resolved_model:
+        logger.info("using model %s", picked)
+        _resolved_model = picked
+        _llms.clear()
+        _bound.clear()
+    return current_model()
+
+
+async def _probe_periodically(interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        await refresh_model()
+
+
+async def start() -> None:
+    """Probe the servers now and keep probing them in the background."""
+    global _probe_task
+    await refresh_model()
+    interval = settings.llm_probe_interval_s
+    if interval > 0 and _probe_task is None:
+        _probe_task = asyncio.create_task(_probe_periodically(interval))
+
+
+async def stop() -> None:
+    global _probe_task, _client
+    if _probe_task is not None:
+        _probe_task.cancel()
+        _probe_task = None
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    _llms.clear()
+    _bound.clear()
 
 
 def current_model() -> str:
-    return _resolve_model()
+    return settings.llm_model or _resolved_model or FALLBACK_MODEL
+
+
+def chat_model(
+    base_url: str,
+    *,
+    temperature: float,
+    streaming: bool,
+    tools: Sequence[BaseTool] = (),
+) -> ChatOpenAI | Runnable:
+    """The cached chat model for one server, with `tools` bound if given.
+
+    Bound models are cached by tool names: the tools' callables are never
+    looked at (callers dispatch tool calls themselves), only their schemas,
+    which must therefore be the same for every tool set with those names.
+    """
+    client = http_client()
+    model = current_model()
+    key = (base_url, model, temperature, streaming)
+    llm = _llms.get(key)
+    if llm is None:
+        llm = _llms[key] = ChatOpenAI(
+            base_url=base_url,
+            api_key=settings.llm_api_key,
+            model=model,
+            streaming=streaming,
+            temperature=temperature,
+            timeout=settings.llm_request_timeout,
+            stream_usage=settings.llm_stream_usage,
+            # With several servers, failing over beats the SDK retrying the same one.
+            max_retries=0 if len(router.backends) > 1 else None,
+            http_async_client=client,
+        )
+    if not tools:
+        return llm
+    bound_key = (key, tuple(t.name for t in tools))
+    bound = _bound.get(bound_key)
+    if bound is None:
+        bound = _bound[bound_key] = llm.bind_tools([convert_to_openai_tool(t) for t in tools])
+    return bound
+
+
+class RoutedLLM:
+    """A chat model whose requests each go to a server picked by the router."""
+
+    def __init__(self, *, temperature: float, streaming: bool, tools: Sequence[BaseTool]) -> None:
+        self.temperature = temperature
+        self.streaming = streaming
+        self.tools = tuple(tools)
+
+    @property
+    def model_name(self) -> str:
+        return current_model()
+
+    def astream(self, messages: list[BaseMessage]) -> AsyncIterator:
+        return router.stream(
+            lambda backend: chat_model(
+                backend.url, temperature=self.temperature, streaming=self.streaming, tools=self.tools,
+            ).astream(messages)
+        )
+
+
+def writer_llm(
+    *,
+    temperature: float = 0.85,
+    streaming: bool = True,
+    tools: Sequence[BaseTool] | None = None,
+) -> RoutedLLM:
+    return RoutedLLM(temperature=temperature, streaming=streaming, tools=tools or ())
@@ -0,0 +1,68 @@
+"""Event-loop lag probe.
+
+A background task asks to be woken every `loop_lag_interval_ms` and records
+how late it actually woke up. Anything that holds the loop (a slow callback, a
+big synchronous serialisation) shows up as lag, and every SSE stream on the
+process stalls for that long. Cheap enough to leave on: one timer per interval.
+"""
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from time import monotonic
+
+from .config import settings
+
+WINDOW = 600  # recent samples kept for percentiles
+
+
+class LoopLagMonitor:
+    def __init__(self) -> None:
+        self.samples = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+        self.recent: deque[float] = deque(maxlen=WINDOW)
+        self._task: asyncio.Task | None = None
+
+    def record(self, lag: float) -> None:
+        self.samples += 1
+        self.total_s += lag
+        self.max_s = max(self.max_s, lag)
+        self.recent.append(lag)
+
+    async def _run(self, interval: float) -> None:
+        while True:
+            started = monotonic()
+            await asyncio.sleep(interval)
+            self.record(max(0.0, monotonic() - started - interval))
+
+    def start(self) -> None:
+        interval = settings.loop_lag_interval_ms / 1000
+        if interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run(interval))
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        recent = sorted(self.recent)
+
+        def pct(q: float) -> float:
+            return round(1000 * recent[min(len(recent) - 1, int(q * len(recent)))], 2) if recent else 0.0
+
+        return {
+            "interval_ms": settings.loop_lag_interval_ms,
+            "samples": self.samples,
+            "total_ms": round(1000 * self.total_s, 2),
+            "avg_ms": round(1000 * self.total_s / self.samples, 2) if self.samples else 0.0,
+            "max_ms": round(1000 * self.max_s, 2),
+            # over the last WINDOW samples
+            "recent_p50_ms": pct(0.5),
+            "recent_p99_ms": pct(0.99),
+            "recent_max_ms": round(1000 * recent[-1], 2) if recent else 0.0,
+        }
+
+
+monitor = LoopLagMonitor()
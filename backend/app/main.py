@@ -1,13 +1,36 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import logging
+
+from fastapi import FastAPI, Header, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
 
-from . import storage
+from . import jobs, llm, loop_lag, metrics, revisions, sse, storage
+from .board_ops import BoardOpError, apply_ops
+from .compression import CompressionMiddleware
 from .config import settings
-from .generation import stream_persona, stream_story
-from .llm import current_model
-from .models import Board, BoardSummary, CreateBoardRequest, PersonaRequest, Scenario
+from .generation import abort_stats, stream_persona
+from .models import (
+    Board,
+    BoardSummary,
+    CreateBoardRequest,
+    JobInfo,
+    PatchBoardRequest,
+    PatchBoardResponse,
+    PersonaRequest,
+    RevisionInfo,
+    Scenario,
+)
 from .scenario import build_scenario
+from .router import router
+from .scheduler import scheduler
+
+app_logger = logging.getLogger("app")
+if not app_logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(levelname)s:     %(name)s - %(message)s"))
+    app_logger.addHandler(_handler)
+app_logger.setLevel(settings.log_level)
 
 app = FastAPI(title="Storywriter Backend")
 
@@ -17,7 +40,56 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Job-Id"],
 )
+if settings.compression:
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.compression_min_bytes)
+
+
+def _etag(version: int, tag: str | None = None) -> str:
+    # The storage tag makes the ETag change on hand edits too, which keep the
+    # version; If-Match only looks at the version part ("7" or "7.<tag>").
+    return f'"{version}.{tag}"' if tag else f'"{version}"'
+
+
+def _board_etag(board: Board) -> str:
+    return _etag(board.version, storage.board_tag(board.id))
+
+
+def _version_from_etag(value: str) -> int:
+    tag = value.strip().removeprefix("W/").strip('"').split(".", 1)[0]
+    try:
+        return int(tag)
+    except ValueError:
+        raise HTTPException(status_code=412, detail=f"Unrecognised ETag {value!r}")
+
+
+def _not_modified(if_none_match: str | None, etag: str) -> bool:
+    """Whether an If-None-Match header lists `etag` (weak comparison)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+
+
+def _revalidate(response: Response, if_none_match: str | None, etag: str) -> Response | None:
+    """Put validators on `response`; returns a 304 to send instead when the
+    client's copy is still current."""
+    # Browsers may keep the body but must revalidate it on every use.
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _not_modified(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+def _conflict(board_id: str, current: int) -> HTTPException:
+    return HTTPException(
+        status_code=412,
+        detail={"message": "Board was modified by someone else", "version": current},
+        headers={"ETag": _etag(current, storage.board_tag(board_id))},
+    )
 
 
 @app.on_event("startup")
@@ -25,14 +97,73 @@ def _seed() -> None:
     storage.seed_sample_board_if_empty()
 
 
+@app.on_event("startup")
+async def _startup_async() -> None:
+    if settings.debug_slow_callback_ms > 0:
+        loop = asyncio.get_running_loop()
+        loop.set_debug(True)
+        loop.slow_callback_duration = settings.debug_slow_callback_ms / 1000
+    loop_lag.monitor.start()
+    await llm.start()
+
+
+@app.on_event("shutdown")
+def _flush_index() -> None:
+    storage.flush_index()
+
+
+@app.on_event("shutdown")
+def _cancel_jobs() -> None:
+    jobs.cancel_all()
+
+
+@app.on_event("shutdown")
+async def _close_llm_client() -> None:
+    loop_lag.monitor.stop()
+    await llm.stop()
+
+
 @app.get("/health")
-async def health() -> dict[str, str]:
-    return {"status": "ok", "model": current_model(), "llm_base_url": settings.llm_base_url}
+async def health() -> dict:
+    return {
+        "status": "ok",
+        "model": llm.current_model(),
+        "llm_base_url": settings.llm_urls[0],
+        "llm_backends_healthy": sum(b.healthy for b in router.backends),
+    }
+
+
+@app.get("/stats")
+def stats() -> dict:
+    return {
+        "board_cache": storage.cache_stats(),
+        "aborted_streams": abort_stats(),
+        "llm_scheduler": scheduler.stats(),
+        "llm_backends": router.stats(),
+        "event_loop": loop_lag.monitor.stats(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics() -> PlainTextResponse:
+    if not settings.metrics:
+        raise HTTPException(status_code=404, detail="Metrics are disabled (SW_METRICS=false)")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.get("/boards", response_model=list[BoardSummary])
-def list_boards() -> list[BoardSummary]:
-    return storage.list_boards()
+def list_boards(
+    response: Response,
+    limit: int | None = Query(default=None, ge=1, le=500),
+    cursor: str | None = None,
+) -> list[BoardSummary]:
+    try:
+        boards, next_cursor = storage.list_boards_page(limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return boards
 
 
 @app.post("/boards", response_model=Board)
@@ -41,39 +172,191 @@ def create_board(req: CreateBoardRequest) -> Board:
 
 
 @app.get("/boards/{board_id}", response_model=Board)
-def get_board(board_id: str) -> Board:
-    board = storage.get_board(board_id)
-    if not board:
+def get_board(
+    board_id: str,
+    response: Response,
+    if_none_match: str | None = Header(default=None),
+) -> Board:
+    # Serialising doesn't mutate, so the cached instance is used as is.
+    hit = storage.peek_board_tagged(board_id)
+    if hit is None:
         raise HTTPException(status_code=404, detail="Board not found")
+    board, tag = hit
+    if (not_modified := _revalidate(response, if_none_match, _etag(board.version, tag))) is not None:
+        return not_modified
     return board
 
 
 @app.put("/boards/{board_id}", response_model=Board)
-def put_board(board_id: str, board: Board) -> Board:
+def put_board(
+    board_id: str,
+    board: Board,
+    response: Response,
+    if_match: str | None = Header(default=None),
+) -> Board:
     if board.id != board_id:
         raise HTTPException(status_code=400, detail="Board id mismatch")
-    return storage.save_board(board)
+    expected = _version_from_etag(if_match) if if_match else None
+    try:
+        saved = storage.save_board(board, expected_version=expected)
+    except storage.VersionConflict as e:
+        raise _conflict(board_id, e.current)
+    response.headers["ETag"] = _board_etag(saved)
+    return saved
 
 
-@app.get("/boards/{board_id}/scenario", response_model=Scenario)
-def get_scenario(board_id: str) -> Scenario:
+@app.patch("/boards/{board_id}", response_model=PatchBoardResponse)
+def patch_board(
+    board_id: str,
+    req: PatchBoardRequest,
+    response: Response,
+    if_match: str | None = Header(default=None),
+) -> PatchBoardResponse:
+    if not if_match:
+        raise HTTPException(status_code=428, detail="PATCH requires If-Match with the board's ETag")
+    expected = _version_from_etag(if_match)
     board = storage.get_board(board_id)
     if not board:
         raise HTTPException(status_code=404, detail="Board not found")
-    return build_scenario(board)
+    if board.version != expected:
+        raise _conflict(board_id, board.version)
+    try:
+        changes = apply_ops(board, req.ops)
+    except BoardOpError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if changes:
+        try:
+            storage.save_board(board, expected_version=expected)
+        except storage.VersionConflict as e:
+            raise _conflict(board_id, e.current)
+    response.headers["ETag"] = _board_etag(board)
+    # Hand over the changed models as they are rather than dumping them to
+    # dicts for PatchBoardResponse to validate back.
+    return PatchBoardResponse(
+        version=board.version,
+        updatedAt=board.updatedAt,
+        board=changes.board,
+        nodes=list(changes.nodes.values()),
+        removedNodes=sorted(changes.removed_nodes),
+        connections=list(changes.connections.values()),
+        removedConnections=list(changes.removed_connections.values()),
+    )
+
+
+@app.get("/boards/{board_id}/revisions", response_model=list[RevisionInfo])
+def list_revisions(board_id: str) -> list[RevisionInfo]:
+    return revisions.list_revisions(board_id)
+
+
+@app.get("/boards/{board_id}/revisions/diff")
+def diff_revisions(
+    board_id: str,
+    rev_from: int = Query(alias="from"),
+    rev_to: int = Query(alias="to"),
+) -> dict:
+    patch = revisions.diff(board_id, rev_from, rev_to)
+    if patch is None:
+        raise HTTPException(status_code=404, detail="Revision not found")
+    return patch
+
+
+@app.get("/boards/{board_id}/revisions/{rev}", response_model=Board)
+def get_revision(board_id: str, rev: int) -> Board:
+    board = revisions.materialize(board_id, rev)
+    if board is None:
+        raise HTTPException(status_code=404, detail="Revision not found")
+    return board
+
+
+@app.post("/boards/{board_id}/revisions/{rev}/restore", response_model=Board)
+def restore_revision(
+    board_id: str,
+    rev: int,
+    response: Response,
+    if_match: str | None = Header(default=None),
+) -> Board:
+    board = revisions.materialize(board_id, rev)
+    if board is None:
+        raise HTTPException(status_code=404, detail="Revision not found")
+    expected = _version_from_etag(if_match) if if_match else None
+    try:
+        saved = storage.save_board(board, expected_version=expected)
+    except storage.VersionConflict as e:
+        raise _conflict(board_id, e.current)
+    response.headers["ETag"] = _board_etag(saved)
+    return saved
+
+
+@app.get("/boards/{board_id}/scenario", response_model=Scenario)
+def get_scenario(
+    board_id: str,
+    response: Response,
+    if_none_match: str | None = Header(default=None),
+) -> Scenario:
+    hit = storage.peek_board_tagged(board_id)
+    if hit is None:
+        raise HTTPException(status_code=404, detail="Board not found")
+    board, tag = hit
+    if (not_modified := _revalidate(response, if_none_match, f'"scenario-{board.version}.{tag}"')) is not None:
+        return not_modified
+    return build_scenario(board, tag=tag)
 
 
 @app.post("/boards/{board_id}/generate")
-async def generate(board_id: str) -> StreamingResponse:
-    board = storage.get_board(board_id)
+async def generate(board_id: str, force: bool = False) -> StreamingResponse:
+    board = await storage.aget_board(board_id)
     if not board:
         raise HTTPException(status_code=404, detail="Board not found")
-    return StreamingResponse(stream_story(board), media_type="text/event-stream")
+    job = jobs.start(board, force=force)
+    return StreamingResponse(
+        sse.frames(job.follow(), stream="generate"),
+        media_type="text/event-stream",
+        headers={"X-Job-Id": job.id},
+    )
+
+
+def _job_or_404(job_id: str) -> jobs.GenerationJob:
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/jobs/{job_id}", response_model=JobInfo)
+async def job_info(job_id: str) -> JobInfo:
+    return _job_or_404(job_id).info()
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(
+    job_id: str,
+    after: int | None = Query(default=None, ge=0),
+    last_event_id: str | None = Header(default=None),
+) -> StreamingResponse:
+    job = _job_or_404(job_id)
+    if after is None:
+        after = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+    return StreamingResponse(
+        sse.frames(job.follow(after), stream="job_events"),
+        media_type="text/event-stream",
+        headers={"X-Job-Id": job.id},
+    )
+
+
+@app.delete("/jobs/{job_id}", response_model=JobInfo)
+async def cancel_job(job_id: str) -> JobInfo:
+    job = _job_or_404(job_id)
+    job.cancel()
+    return job.info()
 
 
 @app.post("/boards/{board_id}/persona")
 async def persona(board_id: str, req: PersonaRequest) -> StreamingResponse:
-    board = storage.get_board(board_id)
+    board = await storage.aget_board(board_id)
     if not board:
         raise HTTPException(status_code=404, detail="Board not found")
-    return StreamingResponse(stream_persona(board, req.message), media_type="text/event-stream")
+    snapshot = req.snapshot or (req.boardVersion is not None and req.boardVersion != board.version)
+    return StreamingResponse(
+        sse.frames(stream_persona(board, req.message, snapshot=snapshot), stream="persona"),
+        media_type="text/event-stream",
+    )
@@ -0,0 +1,223 @@
+"""Prometheus metrics (`GET /metrics`).
+
+Latency, size and count instruments for the paths where a request's time goes:
+the LLM (time to first token, tokens/s and duration per chapter or persona
+iteration), persona tools, storage reads and writes, prompt sizes and open SSE
+streams. The counters behind `/stats` (board cache, scheduler, LLM backends,
+event-loop lag, aborted streams) are exported alongside, read at scrape time.
+
+Instruments are plain in-process objects rendered in the Prometheus text
+format; there is no client library to install. With `SW_METRICS=false` every
+`observe`/`inc` returns at its first line and `/metrics` is a 404.
+"""
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left
+from collections.abc import Iterable
+
+from .config import settings
+
+ENABLED = settings.metrics
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+RATE_BUCKETS = (1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 50.0, 75.0, 100.0, 150.0, 250.0)
+TOKEN_BUCKETS = (256.0, 512.0, 1024.0, 2048.0, 4096.0, 8192.0, 16384.0, 32768.0)
+
+_registry: list[_Metric] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(int(value)) if float(value).is_integer() else repr(value)
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = labels
+        self._values: dict[tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), *, buckets: tuple[float, ...]) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+
+    def observe(self, value: float, **labels: str) -> None:
+        if not ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # per-bucket counts (not cumulative), then +Inf, sum
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        lines = []
+        for key, series in items:
+            running = 0
+            for bound, count in zip((*self.buckets, float("inf")), series):
+                running += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(round(series[-1], 6))}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {running}")
+        return lines
+
+
+# -- instruments -------------------------------------------------------------
+
+LLM_TTFT = Histogram(
+    "sw_llm_time_to_first_token_seconds", "LLM request start (after admission) to first output.",
+    ("kind",), buckets=LATENCY_BUCKETS,
+)
+LLM_DURATION = Histogram(
+    "sw_llm_request_seconds", "LLM request start (after admission) to end of stream.",
+    ("kind",), buckets=LATENCY_BUCKETS,
+)
+LLM_TOKENS_PER_S = Histogram(
+    "sw_llm_tokens_per_second", "Output tokens per second after the first token.",
+    ("kind",), buckets=RATE_BUCKETS,
+)
+LLM_OUTPUT_TOKENS = Counter(
+    "sw_llm_output_tokens_total", "Output tokens (server-reported, else streamed chunks).", ("kind",),
+)
+PROMPT_TOKENS = Histogram(
+    "sw_prompt_tokens", "Approximate prompt size per LLM request.", ("kind",), buckets=TOKEN_BUCKETS,
+)
+CHAPTERS = Counter("sw_chapters_total", "Chapters streamed, by where the text came from.", ("source",))
+TOOL_SECONDS = Histogram(
+    "sw_tool_seconds", "Persona tool call latency.", ("tool",), buckets=FAST_BUCKETS,
+)
+TOOL_CALLS = Counter("sw_tool_calls_total", "Persona tool calls.", ("tool", "outcome"))
+STORAGE_SECONDS = Histogram(
+    "sw_storage_seconds", "Board storage latency (uncached reads and writes).", ("op",), buckets=FAST_BUCKETS,
+)
+STORAGE_BYTES = Counter("sw_storage_bytes_total", "Bytes read from and written to board storage.", ("op",))
+REVISION_ERRORS = Counter("sw_revision_errors_total", "Saves whose revision history entry could not be written.")
+SSE_ACTIVE = Gauge("sw_sse_streams_active", "SSE streams currently open.", ("stream",))
+SSE_STREAMS = Counter("sw_sse_streams_total", "SSE streams opened.", ("stream",))
+
+
+# -- counters kept elsewhere, read at scrape time ------------------------------
+
+def _family(name: str, type: str, help: str, samples: list[tuple[dict, float]]) -> list[str]:
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {type}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+    return lines
+
+
+def _stats_families() -> list[str]:
+    from . import loop_lag, storage
+    from .generation import abort_stats
+    from .router import router
+    from .scheduler import scheduler
+
+    cache = storage.cache_stats()
+    sched = scheduler.stats()
+    backends = router.stats()
+    lag = loop_lag.monitor.stats()
+    aborts = abort_stats()
+    priorities = [p for p in sched if isinstance(sched[p], dict)]
+    return [
+        *_family("sw_board_cache_requests_total", "counter", "Board cache lookups.", [
+            ({"result": "hit"}, cache["hits"]), ({"result": "miss"}, cache["misses"]),
+        ]),
+        *_family("sw_board_cache_evictions_total", "counter", "Board cache evictions.", [({}, cache["evictions"])]),
+        *_family("sw_board_cache_size", "gauge", "Boards in the cache.", [({}, cache["size"])]),
+        *_family("sw_llm_in_flight", "gauge", "LLM requests holding a scheduler slot.", [
+            ({"priority": p}, sched[p]["in_flight"]) for p in priorities
+        ]),
+        *_family("sw_llm_queued", "gauge", "LLM requests waiting for a scheduler slot.", [
+            ({"priority": p}, sched[p]["queued"]) for p in priorities
+        ]),
+        *_family("sw_llm_admitted_total", "counter", "LLM requests admitted by the scheduler.", [
+            ({"priority": p}, sched[p]["admitted"]) for p in priorities
+        ]),
+        *_family("sw_llm_backend_healthy", "gauge", "1 if the LLM server passed its last probe.", [
+            ({"backend": b["url"]}, int(b["healthy"])) for b in backends
+        ]),
+        *_family("sw_llm_backend_outstanding", "gauge", "Requests in flight per LLM server.", [
+            ({"backend": b["url"]}, b["outstanding"]) for b in backends
+        ]),
+        *_family("sw_llm_backend_requests_total", "counter", "Requests sent per LLM server.", [
+            ({"backend": b["url"]}, b["requests"]) for b in backends
+        ]),
+        *_family("sw_llm_backend_errors_total", "counter", "Failed requests per LLM server.", [
+            ({"backend": b["url"]}, b["errors"]) for b in backends
+        ]),
+        *_family("sw_event_loop_lag_seconds", "gauge", "Event-loop lag over the recent window.", [
+            ({"stat": "p50"}, round(lag["recent_p50_ms"] / 1000, 6)),
+            ({"stat": "p99"}, round(lag["recent_p99_ms"] / 1000, 6)),
+            ({"stat": "max"}, round(lag["recent_max_ms"] / 1000, 6)),
+        ]),
+        *_family("sw_aborted_streams_total", "counter", "Streams whose reader left mid-generation.", [
+            ({"stream": "story"}, aborts["story_aborted"]), ({"stream": "persona"}, aborts["persona_aborted"]),
+        ]),
+    ]
+
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format (version 0.0.4)."""
+    lines: list[str] = []
+    for metric in _registry:
+        lines += metric.header()
+        lines += metric.render()
+    lines += _stats_families()
+    return "\n".join(lines) + "\n"
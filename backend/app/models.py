@@ -1,4 +1,4 @@
-from typing import Literal
+from typing import Annotated, Literal
 
 from pydantic import BaseModel, Field
 
@@ -35,6 +35,7 @@ class Board(BaseModel):
     nodes: list[BoardNode] = []
     connections: list[Connection] = []
     updatedAt: str | None = None
+    version: int = 0  # bumped by every save; served as the board's ETag
 
 
 class BoardSummary(BaseModel):
@@ -47,6 +48,101 @@ class BoardSummary(BaseModel):
     updatedAt: str | None = None
 
 
+class NodeFields(BaseModel):
+    """Editable node fields. Only fields present in the request change; null clears."""
+
+    name: str | None = None
+    title: str | None = None
+    role: str | None = None
+    age: str | int | None = None
+    body: str | None = None
+    tags: list[str] | None = None
+
+
+class MoveNodeOp(BaseModel):
+    op: Literal["move"]
+    id: str
+    x: float
+    y: float
+
+
+class UpdateNodeOp(BaseModel):
+    op: Literal["update"]
+    id: str
+    fields: NodeFields
+
+
+class AddNodeOp(BaseModel):
+    op: Literal["add"]
+    node: BoardNode
+
+
+class DeleteNodeOp(BaseModel):
+    op: Literal["delete"]
+    id: str
+
+
+class LinkOp(BaseModel):
+    op: Literal["link"]
+    from_: str = Field(alias="from")
+    to: str
+    label: str | None = None
+
+    model_config = {"populate_by_name": True}
+
+
+class UnlinkOp(BaseModel):
+    op: Literal["unlink"]
+    from_: str = Field(alias="from")
+    to: str
+
+    model_config = {"populate_by_name": True}
+
+
+class SetBoardOp(BaseModel):
+    op: Literal["set"]
+    title: str | None = None
+    personaName: str | None = None
+    palette: PaletteName | None = None
+
+
+BoardOp = Annotated[
+    MoveNodeOp | UpdateNodeOp | AddNodeOp | DeleteNodeOp | LinkOp | UnlinkOp | SetBoardOp,
+    Field(discriminator="op"),
+]
+
+
+class PatchBoardRequest(BaseModel):
+    ops: list[BoardOp]
+
+
+class PatchBoardResponse(BaseModel):
+    """The new version plus only the entities the patch touched."""
+
+    version: int
+    updatedAt: str | None = None
+    board: dict = {}  # changed top-level fields (title, personaName, palette)
+    nodes: list[BoardNode] = []  # added or modified
+    removedNodes: list[str] = []
+    connections: list[Connection] = []  # added or relabelled
+    removedConnections: list[Connection] = []
+
+
+class RevisionInfo(BaseModel):
+    rev: int
+    updatedAt: str | None = None
+    checkpoint: bool  # full snapshot rather than a delta
+    changes: int  # entities touched by the delta
+
+
+class JobInfo(BaseModel):
+    id: str
+    boardId: str
+    status: Literal["running", "done", "cancelled", "failed"]
+    events: int  # events logged so far; Last-Event-ID counts from 1
+    createdAt: str
+
+
 class CreateBoardRequest(BaseModel):
     title: str = "Untitled board"
 
@@ -65,3 +161,7 @@ class Scenario(BaseModel):
 
 class PersonaRequest(BaseModel):
     message: str
+    # the board version the client holds; if it is stale, the first
+    # board_updated event also carries the full board
+    boardVersion: int | None = None
+    snapshot: bool = False  # always include the full board in the first board_updated
@@ -0,0 +1,135 @@
+"""Append-only revision history per board.
+
+Each board gets a directory of segment files under data/revisions/<board_id>/.
+A segment starts with a full checkpoint and holds the per-save deltas that
+follow it (see board_ops.diff_boards), and a new segment is started every
+`revision_checkpoint_interval` revisions. Materialising any revision therefore
+reads exactly one segment, however long the history is.
+"""
+from __future__ import annotations
+
+import json
+import threading
+from pathlib import Path
+
+from .board_ops import apply_patch, diff_boards
+from .config import settings
+from .models import Board, RevisionInfo
+
+REVISIONS_DIR = settings.data_dir / "revisions"
+
+# board id -> (last recorded revision, first revision of its segment)
+_tails: dict[str, tuple[int, int]] = {}
+_lock = threading.Lock()
+
+
+def _dir(board_id: str) -> Path:
+    return REVISIONS_DIR / board_id
+
+
+def _segment_path(board_id: str, first: int) -> Path:
+    return _dir(board_id) / f"{first:08d}.jsonl"
+
+
+def _segments(board_id: str) -> list[int]:
+    d = _dir(board_id)
+    if not d.is_dir():
+        return []
+    return sorted(int(p.stem) for p in d.glob("*.jsonl") if p.stem.isdigit())
+
+
+def _entries(board_id: str, first: int):
+    with open(_segment_path(board_id, first), encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _tail(board_id: str) -> tuple[int, int] | None:
+    if board_id in _tails:
+        return _tails[board_id]
+    segments = _segments(board_id)
+    if not segments:
+        return None
+    last = None
+    for entry in _entries(board_id, segments[-1]):
+        last = entry["rev"]
+    if last is None:
+        return None
+    _tails[board_id] = (last, segments[-1])
+    return _tails[board_id]
+
+
+def record(previous: Board | None, board: Board) -> None:
+    """Log `board` (just saved) as a delta against `previous`, or as a checkpoint
+    when there is no usable predecessor or the segment is full."""
+    if not settings.revision_history:
+        return
+    with _lock:
+        tail = _tail(board.id)
+        if (
+            tail is not None
+            and previous is not None
+            and previous.version == tail[0]
+            and board.version - tail[1] < settings.revision_checkpoint_interval
+        ):
+            first = tail[1]
+            entry = {"rev": board.version, "at": board.updatedAt, "patch": diff_boards(previous, board)}
+            line = json.dumps(entry, separators=(",", ":"))
+        else:
+            first = board.version
+            # Let pydantic write the snapshot straight to JSON instead of
+            # building the whole board as dicts first.
+            head = json.dumps({"rev": board.version, "at": board.updatedAt}, separators=(",", ":"))
+            line = head[:-1] + ',"board":' + board.model_dump_json(by_alias=True) + "}"
+        path = _segment_path(board.id, first)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+        _tails[board.id] = (board.version, first)
+
+
+def list_revisions(board_id: str) -> list[RevisionInfo]:
+    out: list[RevisionInfo] = []
+    for first in _segments(board_id):
+        for entry in _entries(board_id, first):
+            patch = entry.get("patch")
+            out.append(RevisionInfo(
+                rev=entry["rev"],
+                updatedAt=entry.get("at"),
+                checkpoint=patch is None,
+                changes=0 if patch is None else sum(
+                    len(patch.get(k, ()))
+                    for k in ("board", "nodes", "removedNodes", "connections", "removedConnections")
+                ) + ("nodeOrder" in patch) + ("connectionOrder" in patch),
+            ))
+    return out
+
+
+def materialize(board_id: str, rev: int) -> Board | None:
+    """Rebuild revision `rev` from its segment's checkpoint plus deltas."""
+    candidates = [s for s in _segments(board_id) if s <= rev]
+    if not candidates:
+        return None
+    board: Board | None = None
+    for entry in _entries(board_id, candidates[-1]):
+        if entry["rev"] > rev:
+            break
+        if "board" in entry:
+            board = Board.model_validate(entry["board"])
+        elif board is not None:
+            apply_patch(board, entry["patch"])
+        if board is not None:
+            board.version = entry["rev"]
+            board.updatedAt = entry.get("at")
+        if entry["rev"] == rev:
+            return board
+    return None
+
+
+def diff(board_id: str, rev_from: int, rev_to: int) -> dict | None:
+    a = materialize(board_id, rev_from)
+    b = materialize(board_id, rev_to)
+    if a is None or b is None:
+        return None
+    return diff_boards(a, b)
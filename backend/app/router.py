@@ -0,0 +1,210 @@
+"""Spreads LLM requests over several OpenAI-compatible servers.
+
+Each request goes to the usable backend with the fewest requests in flight
+(ties rotate). A backend is usable while its last health probe (`GET /models`,
+every `llm_probe_interval_s`) succeeded and its circuit breaker is closed: after
+`llm_breaker_failures` consecutive failed requests the breaker opens for
+`llm_breaker_cooldown_s`, then lets a single trial request through.
+
+A request that fails, or produces no output within `llm_first_token_timeout_s`,
+is retried on another backend as long as nothing has been passed on to the
+caller yet. Once the first token is out the stream is committed to its backend
+and errors propagate. Client errors (4xx other than 429) are the request's
+fault, not the server's: they are raised as is and don't count against the
+backend.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import AsyncIterator, Callable
+from time import monotonic
+
+import httpx
+import openai
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class NoBackendAvailable(RuntimeError):
+    pass
+
+
+class Backend:
+    def __init__(self, url: str) -> None:
+        self.url = url.rstrip("/")
+        self.healthy = True  # optimistic until the first probe says otherwise
+        self.models: list[str] = []
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0  # breaker open while monotonic() < open_until
+        self.requests = 0
+        self.errors = 0
+        self.retried = 0  # failed before the first token and went elsewhere
+        self.last_error: str | None = None
+        self._first_token_total = 0.0
+        self._first_token_max = 0.0
+        self._first_tokens = 0
+
+    def breaker(self, now: float) -> str:
+        if self.consecutive_failures < settings.llm_breaker_failures:
+            return "closed"
+        return "open" if now < self.open_until else "half-open"
+
+    def usable(self, now: float) -> bool:
+        state = self.breaker(now)
+        if state == "half-open":
+            return self.healthy and self.outstanding == 0  # one trial at a time
+        return self.healthy and state == "closed"
+
+    def first_token(self, seconds: float) -> None:
+        self._first_tokens += 1
+        self._first_token_total += seconds
+        self._first_token_max = max(self._first_token_max, seconds)
+
+    def succeeded(self) -> None:
+        self.consecutive_failures = 0
+
+    def failed(self, error: BaseException) -> None:
+        self.errors += 1
+        self.last_error = f"{type(error).__name__}: {error}"[:200]
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= settings.llm_breaker_failures:
+            self.open_until = monotonic() + settings.llm_breaker_cooldown_s
+            logger.warning("LLM backend %s: circuit open after %s (%s)",
+                           self.url, self.consecutive_failures, self.last_error)
+
+    def stats(self, now: float) -> dict:
+        n = self._first_tokens
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "breaker": self.breaker(now),
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "retried": self.retried,
+            "first_token_avg_ms": round(1000 * self._first_token_total / n, 1) if n else 0.0,
+            "first_token_max_ms": round(1000 * self._first_token_max, 1),
+            "last_error": self.last_error,
+        }
+
+
+def _retryable(error: BaseException) -> bool:
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500 or error.status_code == 429
+    return True
+
+
+def _has_output(chunk) -> bool:
+    return bool(getattr(chunk, "content", None) or getattr(chunk, "tool_call_chunks", None))
+
+
+class LLMRouter:
+    def __init__(self, urls: list[str]) -> None:
+        self.backends = [Backend(u) for u in urls]
+        self._turn = 0
+
+    def pick(self, exclude: set[str] = frozenset()) -> Backend | None:
+        now = monotonic()
+        candidates = [b for b in self.backends if b.url not in exclude]
+        if not candidates:
+            return None
+        # Rotate the starting point so equally loaded backends take turns.
+        self._turn = (self._turn + 1) % len(candidates)
+        rotated = candidates[self._turn:] + candidates[: self._turn]
+        usable = [b for b in rotated if b.usable(now)]
+        if usable:
+            return min(usable, key=lambda b: b.outstanding)
+        # Everything is down or tripped: try the one that should recover first
+        # rather than failing outright.
+        return min(rotated, key=lambda b: (not b.healthy, b.open_until, b.outstanding))
+
+    async def stream(self, open_stream: Callable[[Backend], AsyncIterator]) -> AsyncIterator:
+        """Chunks from `open_stream(backend)`, failing over between backends
+        until the first chunk with output has been received."""
+        tried: set[str] = set()
+        while True:
+            backend = self.pick(tried)
+            if backend is None:
+                raise NoBackendAvailable("no LLM backend left to try")
+            tried.add(backend.url)
+            fallback = len(tried) < len(self.backends)
+            timeout = settings.llm_first_token_timeout_s if fallback else 0
+            backend.requests += 1
+            backend.outstanding += 1
+            started = monotonic()
+            chunks = open_stream(backend).__aiter__()
+            held: list = []
+            try:
+                try:
+                    async with asyncio.timeout(timeout if timeout > 0 else None):
+                        async for chunk in chunks:
+                            held.append(chunk)
+                            if _has_output(chunk):
+                                break
+                except Exception as e:
+                    if isinstance(e, TimeoutError):
+                        e = TimeoutError(f"no output from {backend.url} within {timeout:g}s")
+                    if not _retryable(e):
+                        raise
+                    backend.failed(e)
+                    if not fallback:
+                        raise e
+                    backend.retried += 1
+                    logger.warning("LLM backend %s failed before the first token (%s); trying another",
+                                   backend.url, e)
+                    continue
+                backend.first_token(monotonic() - started)
+                for chunk in held:
+                    yield chunk
+                try:
+                    async for chunk in chunks:
+                        yield chunk
+                except Exception as e:
+                    if _retryable(e):
+                        backend.failed(e)
+                    raise
+                backend.succeeded()
+                return
+            finally:
+                backend.outstanding -= 1
+                aclose = getattr(chunks, "aclose", None)
+                if aclose is not None:
+                    try:
+                        await aclose()
+                    except Exception:
+                        pass
+
+    async def probe(self, client: httpx.AsyncClient) -> None:
+        """Health-check every backend through `GET /models`."""
+
+        async def check(backend: Backend) -> None:
+            try:
+                r = await client.get(
+                    f"{backend.url}/models",
+                    headers={"Authorization": f"Bearer {settings.llm_api_key}"},
+                    timeout=5.0,
+                )
+                r.raise_for_status()
+                backend.models = [m["id"] for m in r.json().get("data", [])]
+                if not backend.healthy:
+                    logger.info("LLM backend %s is back", backend.url)
+                backend.healthy = True
+            except Exception as e:
+                error = str(e).splitlines()[0] if str(e) else type(e).__name__
+                if backend.healthy:
+                    logger.warning("LLM backend %s failed its health probe: %s", backend.url, error)
+                backend.healthy = False
+                backend.last_error = f"probe: {error}"[:200]
+
+        await asyncio.gather(*(check(b) for b in self.backends))
+
+    def stats(self) -> list[dict]:
+        now = monotonic()
+        return [b.stats(now) for b in self.backends]
+
+
+router = LLMRouter(settings.llm_urls)
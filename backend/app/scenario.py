@@ -1,6 +1,12 @@
 import re
+import threading
+from collections import OrderedDict
 
-from .models import Board, Scenario
+from .indexed_board import IndexedBoard
+from .models import Board, BoardNode, Scenario
+
+# Boards whose last scenario is remembered (see build_scenario).
+MEMO_SIZE = 256
 
 
 def _slug(s: str) -> str:
@@ -12,11 +18,9 @@ def _content(n) -> str:
     return " — ".join(parts)
 
 
-def build_scenario(board: Board) -> Scenario:
-    characters: list[dict] = []
-    for n in board.nodes:
-        if n.kind != "character":
-            continue
+def _fragment(n: BoardNode) -> dict:
+    """What a single node contributes to the scenario, computed once per node."""
+    if n.kind == "character":
         entry: dict = {
             "id": _slug(n.name or n.id),
             "name": n.name or "Unnamed",
@@ -29,43 +33,102 @@ def build_scenario(board: Board) -> Scenario:
             entry["traits"] = list(n.tags)
         if n.body:
             entry["description"] = n.body
-        characters.append(entry)
+        return {"slug": entry["id"], "entry": entry}
+    if n.kind == "beat":
+        entry = {"title": n.title or ""}
+        if n.body:
+            entry["description"] = n.body
+        return {"entry": entry}
+    return {"content": _content(n)}
+
+
+class _Memo:
+    __slots__ = ("key", "scenario", "fragments")
+
+    def __init__(self, key, scenario: Scenario, fragments: dict[str, tuple[BoardNode, dict]]) -> None:
+        self.key = key
+        self.scenario = scenario
+        self.fragments = fragments
+
+
+_memos: OrderedDict[str, _Memo] = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def build_scenario(board: Board | IndexedBoard, *, tag: str | None = None) -> Scenario:
+    """Compile a board into its scenario.
+
+    Results are memoised per board. Given the storage `tag` the board was read
+    under (`storage.peek_board_tagged`), asking again for the same stored state
+    returns the previous Scenario; otherwise, and for a changed board, only the
+    fragments of nodes that changed are recomputed. `version` alone is not a
+    key: hand edits and legacy boards keep it. The returned Scenario may be
+    shared, so treat it as read-only. An IndexedBoard is always compiled (its
+    fragments are still reused).
+    """
+    index = board if isinstance(board, IndexedBoard) else None
+    board = index.board if index is not None else board
+    key = (board.version, board.updatedAt, tag) if tag is not None and index is None else None
+    with _memo_lock:
+        memo = _memos.get(board.id)
+        if memo is not None:
+            _memos.move_to_end(board.id)
+    if memo is not None and key is not None and memo.key == key:
+        return memo.scenario
+
+    if index is None:
+        index = IndexedBoard(board)
+    previous = memo.fragments if memo is not None else {}
+    fragments: dict[str, tuple[BoardNode, dict]] = {}
+    for n in index.nodes.values():
+        hit = previous.get(n.id)
+        if hit is not None and (hit[0] is n or hit[0] == n):
+            fragments[n.id] = (n, hit[1])
+        else:
+            fragments[n.id] = (n, _fragment(n))
+
+    scenario = _assemble(board, index, fragments)
+    with _memo_lock:
+        _memos[board.id] = _Memo(key, scenario, fragments)
+        _memos.move_to_end(board.id)
+        while len(_memos) > MEMO_SIZE:
+            _memos.popitem(last=False)
+    return scenario
+
+
+def _assemble(board: Board, index: IndexedBoard, fragments: dict[str, tuple[BoardNode, dict]]) -> Scenario:
+    characters = [fragments[n.id][1]["entry"] for n in index.of_kind("character")]
 
-    world_nodes = [n for n in board.nodes if n.kind == "world"]
-    tone_nodes = [n for n in board.nodes if n.kind == "tone"]
+    world_nodes = index.of_kind("world")
+    tone_nodes = index.of_kind("tone")
 
     setting_node = world_nodes[0] if world_nodes else None
     rule_nodes = world_nodes[1:]
+    rules = (fragments[n.id][1]["content"] for n in rule_nodes)
+    tones = (fragments[n.id][1]["content"] for n in tone_nodes)
 
     world = {
-        "setting": _content(setting_node) if setting_node else "",
-        "rules": [_content(n) for n in rule_nodes if _content(n)],
-        "tone": " ".join(_content(n) for n in tone_nodes if _content(n)),
+        "setting": fragments[setting_node.id][1]["content"] if setting_node else "",
+        "rules": [c for c in rules if c],
+        "tone": " ".join(c for c in tones if c),
     }
 
-    beats = sorted([n for n in board.nodes if n.kind == "beat"], key=lambda n: n.x)
-    beat_entries: list[dict] = []
-    for b in beats:
-        entry: dict = {"title": b.title or ""}
-        if b.body:
-            entry["description"] = b.body
-        beat_entries.append(entry)
+    beats = sorted(index.of_kind("beat"), key=lambda n: n.x)
     plot = {
         "structure": f"{len(beats)}_beats" if beats else "freeform",
-        "beats": beat_entries,
+        "beats": [fragments[b.id][1]["entry"] for b in beats],
     }
 
-    by_id = {n.id: n for n in board.nodes}
     conns: list[list[str]] = []
-    for c in board.connections:
-        a = by_id.get(c.from_)
-        b = by_id.get(c.to)
+    for c in index.connections.values():
+        a = index.get(c.from_)
+        b = index.get(c.to)
         if not a or not b:
             continue
         if a.kind == "character" and b.kind == "character":
             conns.append([
-                _slug(a.name or a.id),
-                _slug(b.name or b.id),
+                fragments[a.id][1]["slug"],
+                fragments[b.id][1]["slug"],
                 _slug(c.label or "related"),
             ])
 
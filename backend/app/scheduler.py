@@ -0,0 +1,127 @@
+"""Admission control in front of the LLM server.
+
+Every streaming LLM call takes a slot from the shared `scheduler` first, so the
+backend never has more than `llm_max_concurrency` requests in flight, however
+many books are being generated. Waiters are served by priority (interactive
+persona turns before batch chapter drafting) and, within a priority, round-robin
+across boards so one long generation can't starve another board's. Batch work
+may also be kept out of the last `llm_interactive_reserve` slots, which keeps
+the persona responsive while chapters are drafting.
+"""
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict, deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from time import monotonic
+
+from .config import settings
+
+INTERACTIVE = 0
+BATCH = 1
+_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+
+class LLMScheduler:
+    def __init__(self) -> None:
+        self.in_flight = {INTERACTIVE: 0, BATCH: 0}
+        # priority -> board id -> waiters, in the order boards should be served
+        self._queues: dict[int, OrderedDict[str, deque[asyncio.Future]]] = {
+            INTERACTIVE: OrderedDict(),
+            BATCH: OrderedDict(),
+        }
+        self._stats = {
+            p: {"admitted": 0, "waited": 0, "wait_total_s": 0.0, "wait_max_s": 0.0}
+            for p in self._queues
+        }
+
+    @staticmethod
+    def _limit(priority: int) -> int:
+        limit = max(1, settings.llm_max_concurrency)
+        if priority == BATCH:
+            return max(1, limit - max(0, settings.llm_interactive_reserve))
+        return limit
+
+    def _can_start(self, priority: int) -> bool:
+        total = sum(self.in_flight.values())
+        if total >= max(1, settings.llm_max_concurrency):
+            return False
+        return priority == INTERACTIVE or self.in_flight[BATCH] < self._limit(BATCH)
+
+    def _queued(self, priority: int) -> int:
+        return sum(len(q) for q in self._queues[priority].values())
+
+    def _wake(self) -> None:
+        for priority in (INTERACTIVE, BATCH):
+            boards = self._queues[priority]
+            while boards and self._can_start(priority):
+                board_id, waiters = next(iter(boards.items()))
+                fut = waiters.popleft()
+                if waiters:
+                    boards.move_to_end(board_id)
+                else:
+                    del boards[board_id]
+                if fut.done():  # cancelled while queued
+                    continue
+                self.in_flight[priority] += 1
+                fut.set_result(None)
+            if self._queued(priority):
+                # Don't let batch work overtake queued interactive requests.
+                return
+
+    def _dequeue(self, priority: int, board_id: str, fut: asyncio.Future) -> None:
+        waiters = self._queues[priority].get(board_id)
+        if waiters and fut in waiters:
+            waiters.remove(fut)
+            if not waiters:
+                del self._queues[priority][board_id]
+        self._wake()
+
+    def _release(self, priority: int) -> None:
+        self.in_flight[priority] -= 1
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self, priority: int, board_id: str) -> AsyncIterator[None]:
+        stats = self._stats[priority]
+        if self._can_start(priority) and not self._queued(INTERACTIVE) and not self._queued(priority):
+            self.in_flight[priority] += 1
+        else:
+            fut = asyncio.get_running_loop().create_future()
+            self._queues[priority].setdefault(board_id, deque()).append(fut)
+            started = monotonic()
+            try:
+                await fut
+            except asyncio.CancelledError:
+                if fut.cancelled():
+                    self._dequeue(priority, board_id, fut)
+                else:
+                    self._release(priority)  # granted just as we were cancelled
+                raise
+            waited = monotonic() - started
+            stats["waited"] += 1
+            stats["wait_total_s"] += waited
+            stats["wait_max_s"] = max(stats["wait_max_s"], waited)
+        stats["admitted"] += 1
+        try:
+            yield
+        finally:
+            self._release(priority)
+
+    def stats(self) -> dict:
+        out: dict = {"max_concurrency": max(1, settings.llm_max_concurrency)}
+        for priority, name in _NAMES.items():
+            s = self._stats[priority]
+            out[name] = {
+                "in_flight": self.in_flight[priority],
+                "queued": self._queued(priority),
+                "admitted": s["admitted"],
+                "waited": s["waited"],
+                "wait_avg_ms": round(1000 * s["wait_total_s"] / s["waited"], 1) if s["waited"] else 0.0,
+                "wait_max_ms": round(1000 * s["wait_max_s"], 1),
+            }
+        return out
+
+
+scheduler = LLMScheduler()
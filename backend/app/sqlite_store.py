@@ -0,0 +1,260 @@
+"""SQLite board storage (`SW_STORAGE=sqlite`).
+
+Boards, nodes and connections live in separate indexed tables, one row per
+node/connection, so saving a board only rewrites the rows that changed.
+Finding those rows is still O(board): each save reads the board's stored rows
+and serialises every node to compare (see _sync_nodes).
+
+Import existing JSON boards with:
+
+    uv run python -m app.sqlite_store migrate
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+from . import metrics
+from .models import Board
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS boards (
+    id           TEXT PRIMARY KEY,
+    title        TEXT NOT NULL,
+    persona_name TEXT NOT NULL,
+    palette      TEXT NOT NULL,
+    updated_at   TEXT NOT NULL DEFAULT '',
+    version      INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS boards_by_updated ON boards (updated_at DESC, id DESC);
+
+CREATE TABLE IF NOT EXISTS nodes (
+    board_id TEXT NOT NULL REFERENCES boards (id) ON DELETE CASCADE,
+    id       TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    kind     TEXT NOT NULL,
+    data     TEXT NOT NULL,
+    PRIMARY KEY (board_id, id)
+);
+CREATE INDEX IF NOT EXISTS nodes_by_kind ON nodes (board_id, kind);
+
+CREATE TABLE IF NOT EXISTS connections (
+    board_id TEXT NOT NULL REFERENCES boards (id) ON DELETE CASCADE,
+    from_id  TEXT NOT NULL,
+    to_id    TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    label    TEXT,
+    PRIMARY KEY (board_id, from_id, to_id)
+);
+"""
+
+
+def _positions(new_ids: list, old_pos: dict) -> dict:
+    """Keep stored positions where the order is unchanged; append new rows after
+    the current maximum. Renumber everything only if rows were reordered or
+    inserted in the middle."""
+    top = max(old_pos.values(), default=-1)
+    out = {}
+    last = -1
+    for key in new_ids:
+        p = old_pos.get(key)
+        if p is None:
+            top += 1
+            p = top
+        if p <= last:
+            return {k: i for i, k in enumerate(new_ids)}
+        out[key] = p
+        last = p
+    return out
+
+
+class SqliteBoardStore:
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA foreign_keys=ON")
+            self._conn.executescript(SCHEMA)
+
+    def stamp(self, board_id: str) -> int | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version FROM boards WHERE id = ?", (board_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def load(self, board_id: str) -> tuple[Board, int]:
+        with self._lock:
+            head = self._conn.execute(
+                "SELECT title, persona_name, palette, updated_at, version FROM boards WHERE id = ?",
+                (board_id,),
+            ).fetchone()
+            if head is None:
+                raise KeyError(board_id)
+            nodes = self._conn.execute(
+                "SELECT data FROM nodes WHERE board_id = ? ORDER BY position", (board_id,)
+            ).fetchall()
+            conns = self._conn.execute(
+                "SELECT from_id, to_id, label FROM connections WHERE board_id = ? ORDER BY position",
+                (board_id,),
+            ).fetchall()
+        title, persona_name, palette, updated_at, version = head
+        # Assemble the JSON document from the stored node rows and validate it in one pass.
+        doc = (
+            '{"id":%s,"title":%s,"personaName":%s,"palette":%s,"updatedAt":%s,"version":%d,'
+            '"nodes":[%s],"connections":%s}'
+            % (
+                json.dumps(board_id), json.dumps(title), json.dumps(persona_name),
+                json.dumps(palette), json.dumps(updated_at or None), version,
+                ",".join(r[0] for r in nodes),
+                json.dumps([{"from": f, "to": t, "label": label} for f, t, label in conns]),
+            )
+        )
+        metrics.STORAGE_BYTES.inc(len(doc), op="read")
+        return Board.model_validate_json(doc), version
+
+    def write(self, board: Board) -> int:
+        with self._lock, self._conn:
+            self._conn.execute(
+                """INSERT INTO boards (id, title, persona_name, palette, updated_at, version)
+                   VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (id) DO UPDATE SET
+                     title = excluded.title, persona_name = excluded.persona_name,
+                     palette = excluded.palette, updated_at = excluded.updated_at,
+                     version = excluded.version""",
+                (board.id, board.title, board.personaName, board.palette,
+                 board.updatedAt or "", board.version),
+            )
+            self._sync_nodes(board)
+            self._sync_connections(board)
+        return board.version
+
+    def _sync_nodes(self, board: Board) -> None:
+        """Upsert the node rows whose position or data changed, delete the rest.
+
+        Only changed rows are written, but finding them reads every stored row
+        and serialises every node, so a one-card edit still costs O(board).
+        The write path gets whole boards (PUT replaces one outright), so there
+        is no changed-id set to narrow this down to.
+        """
+        old = {
+            nid: (pos, data)
+            for nid, pos, data in self._conn.execute(
+                "SELECT id, position, data FROM nodes WHERE board_id = ?", (board.id,)
+            )
+        }
+        new = [(n.id, n.kind, n.model_dump_json()) for n in board.nodes]
+        pos = _positions([nid for nid, _, _ in new], {k: v[0] for k, v in old.items()})
+        rows = [
+            (board.id, nid, pos[nid], kind, data)
+            for nid, kind, data in new
+            if old.get(nid) != (pos[nid], data)
+        ]
+        self._conn.executemany(
+            """INSERT INTO nodes (board_id, id, position, kind, data) VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT (board_id, id) DO UPDATE SET
+                 position = excluded.position, kind = excluded.kind, data = excluded.data""",
+            rows,
+        )
+        metrics.STORAGE_BYTES.inc(sum(len(r[4]) for r in rows), op="write")
+        gone = old.keys() - {nid for nid, _, _ in new}
+        self._conn.executemany(
+            "DELETE FROM nodes WHERE board_id = ? AND id = ?",
+            [(board.id, nid) for nid in gone],
+        )
+
+    def _sync_connections(self, board: Board) -> None:
+        old = {
+            (f, t): (pos, label)
+            for f, t, pos, label in self._conn.execute(
+                "SELECT from_id, to_id, position, label FROM connections WHERE board_id = ?",
+                (board.id,),
+            )
+        }
+        new = [((c.from_, c.to), c.label) for c in board.connections]
+        pos = _positions([k for k, _ in new], {k: v[0] for k, v in old.items()})
+        self._conn.executemany(
+            """INSERT INTO connections (board_id, from_id, to_id, position, label)
+               VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT (board_id, from_id, to_id) DO UPDATE SET
+                 position = excluded.position, label = excluded.label""",
+            [
+                (board.id, f, t, pos[(f, t)], label)
+                for (f, t), label in new
+                if old.get((f, t)) != (pos[(f, t)], label)
+            ],
+        )
+        gone = old.keys() - {k for k, _ in new}
+        self._conn.executemany(
+            "DELETE FROM connections WHERE board_id = ? AND from_id = ? AND to_id = ?",
+            [(board.id, f, t) for f, t in gone],
+        )
+
+    def page(self, after: tuple[str, str] | None, limit: int | None) -> list[dict]:
+        where, params = ("WHERE (b.updated_at, b.id) < (?, ?)", list(after)) if after else ("", [])
+        with self._lock:
+            rows = self._conn.execute(
+                f"""SELECT b.id, b.title, b.persona_name, b.palette, b.updated_at,
+                           (SELECT COUNT(*) FROM nodes n WHERE n.board_id = b.id),
+                           (SELECT COUNT(*) FROM connections c WHERE c.board_id = b.id)
+                    FROM boards b
+                    {where}
+                    ORDER BY b.updated_at DESC, b.id DESC
+                    LIMIT ?""",
+                (*params, -1 if limit is None else limit),
+            ).fetchall()
+        return [
+            {
+                "id": bid, "title": title, "personaName": persona_name, "palette": palette,
+                "updatedAt": updated_at or None, "nodeCount": nodes, "connectionCount": conns,
+            }
+            for bid, title, persona_name, palette, updated_at, nodes, conns in rows
+        ]
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM boards LIMIT 1").fetchone() is None
+
+    def flush(self) -> None:
+        pass
+
+
+def migrate(store: SqliteBoardStore, boards_dir: Path) -> tuple[int, int]:
+    """Import every board file under `boards_dir`, keeping its updatedAt."""
+    from .storage import read_board_file
+
+    imported = failed = 0
+    for p in sorted(boards_dir.glob("*.json")):
+        try:
+            store.write(read_board_file(p))
+        except Exception as e:
+            print(f"skipped {p.name}: {e}")
+            failed += 1
+            continue
+        imported += 1
+    return imported, failed
+
+
+def main() -> None:
+    from .config import settings
+
+    parser = argparse.ArgumentParser(prog="python -m app.sqlite_store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    m = sub.add_parser("migrate", help="import data/boards/*.json into the SQLite database")
+    m.add_argument("--from", dest="source", type=Path, default=settings.boards_dir)
+    m.add_argument("--db", type=Path, default=settings.sqlite_path)
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        imported, failed = migrate(SqliteBoardStore(args.db), args.source)
+        print(f"imported {imported} board(s) into {args.db}" + (f", {failed} failed" if failed else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Server-sent event framing for the generation streams.
+
+The generators in generation.py yield plain event dicts; `frames` turns them
+into SSE bytes. Consecutive `token` events are merged for up to
+`sse_coalesce_ms` (or until `sse_coalesce_bytes` of text has piled up) so a
+50 tok/s model produces a few dozen frames a second instead of one per token,
+and a `: ping` comment goes out whenever the stream has been silent for
+`sse_heartbeat_s`, so idle proxies don't cut a long chapter off.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+from collections.abc import AsyncIterator
+from time import monotonic
+
+from . import metrics
+from .config import settings
+
+try:  # orjson ships with langchain's dependencies; fall back if it's missing
+    import orjson
+
+    def _dumps(payload: dict) -> bytes:
+        return orjson.dumps(payload)
+except ImportError:  # pragma: no cover
+    def _dumps(payload: dict) -> bytes:
+        return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode()
+
+HEARTBEAT = b": ping\n\n"
+
+
+def encode(payload: dict) -> bytes:
+    event_id = payload.pop("id", None)
+    data = b"data: " + _dumps(payload) + b"\n\n"
+    return data if event_id is None else b"id: %d\n" % event_id + data
+
+
+async def frames(
+    events: AsyncIterator[dict],
+    *,
+    window_ms: float | None = None,
+    max_bytes: int | None = None,
+    heartbeat_s: float | None = None,
+    stream: str = "other",
+) -> AsyncIterator[bytes]:
+    """Frame `events` as SSE. An "id" key, if present, is moved out of the
+    payload into the frame's `id:` field; a coalesced token frame takes the id
+    of the last token merged into it. `stream` labels the open-streams metric."""
+    window = (settings.sse_coalesce_ms if window_ms is None else window_ms) / 1000
+    limit = settings.sse_coalesce_bytes if max_bytes is None else max_bytes
+    heartbeat = settings.sse_heartbeat_s if heartbeat_s is None else heartbeat_s
+
+    pending: list[str] = []
+    pending_size = 0
+    pending_id = None
+    deadline = 0.0
+    last_write = monotonic()
+
+    def flush() -> bytes:
+        nonlocal pending, pending_size
+        payload = {"type": "token", "content": "".join(pending)}
+        if pending_id is not None:
+            payload["id"] = pending_id
+        pending, pending_size = [], 0
+        return encode(payload)
+
+    # The next event is always being fetched in its own task, so we can wait on
+    # it with a timeout (for flushes and heartbeats) without cancelling it.
+    it = aiter(events)
+    step = asyncio.ensure_future(anext(it))
+    metrics.SSE_STREAMS.inc(stream=stream)
+    metrics.SSE_ACTIVE.inc(stream=stream)
+    try:
+        while True:
+            timeouts = [heartbeat - (monotonic() - last_write)] if heartbeat > 0 else []
+            if pending:
+                timeouts.append(deadline - monotonic())
+            if not step.done():
+                await asyncio.wait({step}, timeout=max(0.0, min(timeouts)) if timeouts else None)
+            if not step.done():
+                now = monotonic()
+                if pending and now >= deadline:
+                    yield flush()
+                    last_write = now
+                elif heartbeat > 0 and now - last_write >= heartbeat:
+                    yield HEARTBEAT
+                    last_write = now
+                continue
+            try:
+                event = step.result()
+            except StopAsyncIteration:
+                break
+            step = asyncio.ensure_future(anext(it))
+
+            if event.get("type") == "token" and window > 0:
+                if not pending:
+                    deadline = monotonic() + window
+                pending.append(event["content"])
+                pending_size += len(event["content"])
+                pending_id = event.get("id")
+                if limit and pending_size >= limit:
+                    yield flush()
+                    last_write = monotonic()
+                continue
+            if pending:
+                yield flush()
+            yield encode(dict(event))
+            last_write = monotonic()
+        if pending:
+            yield flush()
+    finally:
+        # Cancelling the in-flight step unwinds the source generator (and any
+        # LLM stream it is awaiting) in its own task; nothing here awaits, so
+        # this is safe while our own consumer is being cancelled.
+        metrics.SSE_ACTIVE.dec(stream=stream)
+        if not step.done():
+            step.cancel()
+        elif not step.cancelled() and step.exception() is None:
+            asyncio.ensure_future(it.aclose())
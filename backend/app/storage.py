@@ -1,63 +1,446 @@
+import asyncio
+import base64
+import gzip
+import hashlib
 import json
+import logging
+import os
+import threading
 import uuid
+from collections import OrderedDict
+from collections.abc import Hashable
 from datetime import datetime, timezone
 from pathlib import Path
+from time import perf_counter
+from typing import Protocol
 
+from . import metrics, revisions
 from .config import settings
 from .models import Board, BoardSummary
 
-BOARDS_DIR = settings.data_dir / "boards"
+logger = logging.getLogger(__name__)
+
+BOARDS_DIR = settings.boards_dir
 BOARDS_DIR.mkdir(parents=True, exist_ok=True)
 
+# Summary index for the JSON backend: one entry per board file, keyed by id,
+# stamped with the file's (mtime_ns, size) so stale entries can be re-read
+# individually. Kept in memory, updated on write, and flushed to disk lazily.
+INDEX_PATH = settings.data_dir / "board_index.json"
+INDEX_VERSION = 1
 
-def _path(board_id: str) -> Path:
-    return BOARDS_DIR / f"{board_id}.json"
+GZIP_MAGIC = b"\x1f\x8b"
 
+SortKey = tuple[str, str]
 
-def list_boards() -> list[BoardSummary]:
-    out: list[BoardSummary] = []
-    for p in sorted(BOARDS_DIR.glob("*.json")):
+
+class BoardStore(Protocol):
+    """What the storage facade needs from a backend.
+
+    `stamp` must be cheap (no parse): the board cache serves an entry only while
+    the backend still reports the stamp it was cached under. `load` returns the
+    board together with the stamp of the very state it was read from.
+    """
+
+    def stamp(self, board_id: str) -> Hashable | None: ...
+
+    def load(self, board_id: str) -> tuple[Board, Hashable]: ...
+
+    def write(self, board: Board) -> Hashable: ...
+
+    def page(self, after: SortKey | None, limit: int | None) -> list[dict]: ...
+
+    def is_empty(self) -> bool: ...
+
+    def flush(self) -> None: ...
+
+
+def _parse_board(raw: bytes) -> Board:
+    metrics.STORAGE_BYTES.inc(len(raw), op="read")
+    if raw[:2] == GZIP_MAGIC:
+        raw = gzip.decompress(raw)
+    return Board.model_validate_json(raw)
+
+
+def read_board_file(path: Path) -> Board:
+    """Parse a board file in any supported format (indented, compact or gzipped JSON)."""
+    return _parse_board(path.read_bytes())
+
+
+def _encode(board: Board) -> bytes:
+    if settings.board_format == "pretty":
+        return board.model_dump_json(by_alias=True, indent=2).encode()
+    data = board.model_dump_json(by_alias=True).encode()
+    if settings.board_format == "gzip":
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    return data
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    """Write via a temp file in the same directory and rename over the target,
+    so readers and crashes only ever see the old or the new file."""
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def _summary_entry(board: Board) -> dict:
+    return {
+        "id": board.id,
+        "title": board.title,
+        "personaName": board.personaName,
+        "palette": board.palette,
+        "nodeCount": len(board.nodes),
+        "connectionCount": len(board.connections),
+        "updatedAt": board.updatedAt,
+    }
+
+
+def _sort_key(entry: dict) -> SortKey:
+    return (entry.get("updatedAt") or "", entry["id"])
+
+
+class JsonFileStore:
+    """One JSON file per board under data/boards, plus the summary index."""
+
+    def __init__(self, boards_dir: Path, index_path: Path) -> None:
+        self.boards_dir = boards_dir
+        self.index_path = index_path
+        self._index: dict[str, dict] | None = None
+        self._index_dirty = False
+        self._lock = threading.Lock()
+
+    def path(self, board_id: str) -> Path:
+        return self.boards_dir / f"{board_id}.json"
+
+    def stamp(self, board_id: str) -> tuple[int, int] | None:
         try:
-            b = Board.model_validate_json(p.read_text(encoding="utf-8"))
-        except Exception:
-            continue
-        out.append(
-            BoardSummary(
-                id=b.id,
-                title=b.title,
-                personaName=b.personaName,
-                palette=b.palette,
-                nodeCount=len(b.nodes),
-                connectionCount=len(b.connections),
-                updatedAt=b.updatedAt,
-            )
+            st = self.path(board_id).stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def load(self, board_id: str) -> tuple[Board, tuple[int, int]]:
+        # Stat the open file, not the path: a save renamed over it in between
+        # can't pair one version's stamp with the other's content.
+        with open(self.path(board_id), "rb") as f:
+            st = os.fstat(f.fileno())
+            raw = f.read()
+        return _parse_board(raw), (st.st_mtime_ns, st.st_size)
+
+    def write(self, board: Board) -> tuple[int, int]:
+        p = self.path(board.id)
+        data = _encode(board)
+        _write_atomic(p, data)
+        metrics.STORAGE_BYTES.inc(len(data), op="write")
+        st = p.stat()
+        with self._lock:
+            self._load_index()[board.id] = {
+                **_summary_entry(board), "mtime": st.st_mtime_ns, "size": st.st_size,
+            }
+            self._index_dirty = True
+        return (st.st_mtime_ns, st.st_size)
+
+    def _load_index(self) -> dict[str, dict]:
+        if self._index is None:
+            self._index = {}
+            try:
+                data = json.loads(self.index_path.read_text(encoding="utf-8"))
+                if data.get("version") == INDEX_VERSION:
+                    self._index = data.get("boards", {})
+            except (OSError, ValueError):
+                pass
+        return self._index
+
+    def _refresh_index(self) -> dict[str, dict]:
+        """Bring the index in line with the files on disk.
+
+        Only files whose (mtime, size) changed since they were indexed are parsed;
+        everything else costs a single stat.
+        """
+        index = self._load_index()
+        seen: set[str] = set()
+        with os.scandir(self.boards_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(".json") or not entry.is_file():
+                    continue
+                board_id = entry.name[: -len(".json")]
+                seen.add(board_id)
+                st = entry.stat()
+                cached = index.get(board_id)
+                if cached and cached["mtime"] == st.st_mtime_ns and cached["size"] == st.st_size:
+                    continue
+                try:
+                    b = read_board_file(Path(entry.path))
+                except Exception:
+                    if index.pop(board_id, None) is not None:
+                        self._index_dirty = True
+                    continue
+                index[board_id] = {**_summary_entry(b), "mtime": st.st_mtime_ns, "size": st.st_size}
+                self._index_dirty = True
+        for board_id in set(index) - seen:
+            del index[board_id]
+            self._index_dirty = True
+        return index
+
+    def page(self, after: SortKey | None, limit: int | None) -> list[dict]:
+        with self._lock:
+            index = self._refresh_index()
+            self._flush_locked()
+            entries = sorted(index.values(), key=_sort_key, reverse=True)
+        if after is not None:
+            entries = [e for e in entries if _sort_key(e) < after]
+        return entries if limit is None else entries[:limit]
+
+    def is_empty(self) -> bool:
+        return not any(self.boards_dir.glob("*.json"))
+
+    def _flush_locked(self) -> None:
+        if self._index is None or not self._index_dirty:
+            return
+        _write_atomic(
+            self.index_path,
+            json.dumps({"version": INDEX_VERSION, "boards": self._index}).encode(),
         )
-    return out
+        self._index_dirty = False
 
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
 
-def get_board(board_id: str) -> Board | None:
-    p = _path(board_id)
-    if not p.exists():
+
+def _make_store() -> BoardStore:
+    if settings.storage == "sqlite":
+        from .sqlite_store import SqliteBoardStore
+
+        return SqliteBoardStore(settings.sqlite_path)
+    return JsonFileStore(BOARDS_DIR, INDEX_PATH)
+
+
+_store: BoardStore = _make_store()
+
+# Parsed-board LRU cache: id -> (stamp, Board). An entry is only served while
+# the backend still reports the stamp it was cached with (file mtime/size, or
+# the row version for SQLite), so hand edits and other processes invalidate it.
+# Callers always get a deep copy.
+_cache: OrderedDict[str, tuple[Hashable, Board]] = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+
+def _cache_put(board_id: str, stamp: Hashable, board: Board) -> None:
+    if settings.board_cache_size <= 0:
+        return
+    with _cache_lock:
+        _cache[board_id] = (stamp, board)
+        _cache.move_to_end(board_id)
+        while len(_cache) > settings.board_cache_size:
+            _cache.popitem(last=False)
+            _cache_stats["evictions"] += 1
+
+
+def _cache_get(board_id: str, stamp: Hashable) -> Board | None:
+    with _cache_lock:
+        hit = _cache.get(board_id)
+        if hit is None:
+            _cache_stats["misses"] += 1
+            return None
+        if hit[0] != stamp:
+            del _cache[board_id]
+            _cache_stats["invalidations"] += 1
+            _cache_stats["misses"] += 1
+            return None
+        _cache.move_to_end(board_id)
+        _cache_stats["hits"] += 1
+        return hit[1]
+
+
+def invalidate(board_id: str) -> None:
+    with _cache_lock:
+        if _cache.pop(board_id, None) is not None:
+            _cache_stats["invalidations"] += 1
+
+
+def cache_stats() -> dict[str, int]:
+    with _cache_lock:
+        return {**_cache_stats, "size": len(_cache), "capacity": settings.board_cache_size}
+
+
+def flush_index() -> None:
+    _store.flush()
+
+
+def _encode_cursor(key: SortKey) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> SortKey:
+    try:
+        updated_at, board_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (str(updated_at), str(board_id))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def list_boards_page(
+    limit: int | None = None,
+    cursor: str | None = None,
+) -> tuple[list[BoardSummary], str | None]:
+    """Summaries sorted by updatedAt, newest first, plus the cursor for the next page."""
+    after = _decode_cursor(cursor) if cursor else None
+    entries = _store.page(after, None if limit is None else limit + 1)
+    next_cursor = None
+    if limit is not None and len(entries) > limit:
+        entries = entries[:limit]
+        next_cursor = _encode_cursor(_sort_key(entries[-1]))
+    return [BoardSummary.model_validate(e) for e in entries], next_cursor
+
+
+def list_boards() -> list[BoardSummary]:
+    return list_boards_page()[0]
+
+
+def _tag(stamp: Hashable) -> str:
+    return hashlib.blake2b(repr(stamp).encode(), digest_size=6).hexdigest()
+
+
+def board_tag(board_id: str) -> str | None:
+    """Short opaque tag of the stored board's state (see peek_board_tagged)."""
+    stamp = _store.stamp(board_id)
+    return _tag(stamp) if stamp is not None else None
+
+
+def peek_board_tagged(board_id: str) -> tuple[Board, str] | None:
+    """peek_board, plus a tag of the stored state the board was read from.
+
+    The tag is derived from the backend's stamp (file mtime/size, or the
+    SQLite row version), so unlike `version` it also changes on hand edits and
+    on writes from other processes. Use it for validators and memo keys.
+    """
+    stamp = _store.stamp(board_id)
+    if stamp is None:
+        invalidate(board_id)
         return None
-    return Board.model_validate_json(p.read_text(encoding="utf-8"))
+    cached = _cache_get(board_id, stamp)
+    if cached is None:
+        started = perf_counter()
+        try:
+            # The stamp of what was actually read: the state may have moved on
+            # since the one checked above.
+            cached, stamp = _store.load(board_id)
+        except (FileNotFoundError, KeyError):
+            return None
+        metrics.STORAGE_SECONDS.observe(perf_counter() - started, op="read")
+        _cache_put(board_id, stamp, cached)
+    return cached, _tag(stamp)
+
+
+def peek_board(board_id: str) -> Board | None:
+    """The current stored board as the cached instance, without a copy.
+
+    For read-only callers (serialising a response, compiling the scenario);
+    anything that may mutate the board must use get_board.
+    """
+    hit = peek_board_tagged(board_id)
+    return hit[0] if hit is not None else None
 
 
-def save_board(board: Board) -> Board:
-    board.updatedAt = datetime.now(timezone.utc).isoformat()
-    _path(board.id).write_text(
-        board.model_dump_json(by_alias=True, indent=2),
-        encoding="utf-8",
-    )
+def _copy(board: Board) -> Board:
+    """An independent copy of `board`.
+
+    Every field except the node and connection lists (and node tags) is
+    immutable, so copying just those is enough, and it is about three times
+    faster than `model_copy(deep=True)`, which deep-copies every string.
+    """
+    return board.model_copy(update={
+        "nodes": [
+            n.model_copy(update={"tags": list(n.tags)}) if n.tags is not None else n.model_copy()
+            for n in board.nodes
+        ],
+        "connections": [c.model_copy() for c in board.connections],
+    })
+
+
+def get_board(board_id: str) -> Board | None:
+    cached = peek_board(board_id)
+    return _copy(cached) if cached is not None else None
+
+
+class VersionConflict(Exception):
+    """The stored board is no longer at the version the caller based its edit on."""
+
+    def __init__(self, board_id: str, current: int) -> None:
+        super().__init__(f"Board {board_id} is at version {current}")
+        self.current = current
+
+
+_write_locks: dict[str, threading.Lock] = {}
+_write_locks_guard = threading.Lock()
+
+
+def _write_lock(board_id: str) -> threading.Lock:
+    with _write_locks_guard:
+        return _write_locks.setdefault(board_id, threading.Lock())
+
+
+def current_version(board_id: str) -> int | None:
+    current = peek_board(board_id)
+    return current.version if current else None
+
+
+def save_board(board: Board, expected_version: int | None = None) -> Board:
+    """Persist `board` as the next version.
+
+    With `expected_version`, the write only happens if the stored board is still
+    at that version; otherwise VersionConflict is raised.
+    """
+    with _write_lock(board.id):
+        current = peek_board(board.id)
+        version = current.version if current else 0
+        if expected_version is not None and expected_version != version:
+            raise VersionConflict(board.id, version)
+        board.version = version + 1
+        board.updatedAt = datetime.now(timezone.utc).isoformat()
+        started = perf_counter()
+        stamp = _store.write(board)
+        metrics.STORAGE_SECONDS.observe(perf_counter() - started, op="write")
+        _cache_put(board.id, stamp, _copy(board))
+        # The save is committed at this point; a missing revision must not turn
+        # it into an error (the next one is recorded as a checkpoint instead).
+        try:
+            revisions.record(current, board)
+        except Exception:
+            metrics.REVISION_ERRORS.inc()
+            logger.exception("board %s: could not record revision %d", board.id, board.version)
     return board
 
 
+# Async entry points for code running on the event loop: the blocking file or
+# database work happens on a worker thread.
+
+
+async def aget_board(board_id: str) -> Board | None:
+    return await asyncio.to_thread(get_board, board_id)
+
+
+async def asave_board(board: Board, expected_version: int | None = None) -> Board:
+    return await asyncio.to_thread(save_board, board, expected_version)
+
+
 def create_board(title: str) -> Board:
     board = Board(id=uuid.uuid4().hex[:10], title=title)
     return save_board(board)
 
 
 def seed_sample_board_if_empty() -> None:
-    if any(BOARDS_DIR.glob("*.json")):
+    if not _store.is_empty():
         return
     sample_path = Path(__file__).resolve().parent / "sample_board.json"
     if sample_path.exists():
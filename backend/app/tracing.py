@@ -0,0 +1,127 @@
+"""Optional per-request trace spans (`SW_TRACING`).
+
+`start_span` opens a root span for a stream (one book, one persona turn) and
+`span.child` the spans inside it: chapters, LLM iterations, tool calls, saves.
+Parents are passed explicitly rather than through context variables, because
+the spans live inside async generators that may be resumed and closed from
+different tasks.
+
+- `off` (default): `start_span` returns one shared no-op span; the cost is a
+  function call.
+- `log`: each finished span is logged on `app.trace` as one JSON line with its
+  trace id, parent, duration and attributes.
+- `otel`: spans go to the OpenTelemetry tracer (needs `opentelemetry-api`, and
+  an SDK/exporter configured in the process, e.g. via `opentelemetry-instrument`).
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+from time import monotonic, time
+
+from .config import settings
+
+logger = logging.getLogger("app.trace")
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # pragma: no cover
+    otel_trace = None
+
+
+class _NoopSpan:
+    def child(self, name: str, **attrs) -> _NoopSpan:
+        return self
+
+    def set(self, **attrs) -> None:
+        pass
+
+    def end(self, error: BaseException | None = None) -> None:
+        pass
+
+    def __enter__(self) -> _NoopSpan:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+class _Span:
+    """A span that records itself; `end` hands it to the backend."""
+
+    def __init__(self, name: str, attrs: dict, parent: _Span | None = None) -> None:
+        self.name = name
+        self.attrs = attrs
+        self.trace_id = parent.trace_id if parent else os.urandom(8).hex()
+        self.span_id = os.urandom(4).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.started = monotonic()
+        self.wall = time()
+        self._ended = False
+
+    def child(self, name: str, **attrs) -> _Span:
+        return type(self)(name, attrs, self)
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def end(self, error: BaseException | None = None) -> None:
+        if self._ended:
+            return
+        self._ended = True
+        if error is not None:
+            self.attrs["error"] = f"{type(error).__name__}: {error}"
+        self._export(monotonic() - self.started)
+
+    def _export(self, duration: float) -> None:
+        logger.info(json.dumps({
+            "trace": self.trace_id,
+            "span": self.span_id,
+            "parent": self.parent_id,
+            "name": self.name,
+            "start": round(self.wall, 6),
+            "duration_ms": round(1000 * duration, 2),
+            **self.attrs,
+        }, default=str))
+
+    def __enter__(self) -> _Span:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.end(exc)
+
+
+class _OtelSpan(_Span):
+    def __init__(self, name: str, attrs: dict, parent: _OtelSpan | None = None) -> None:
+        super().__init__(name, attrs, parent)
+        context = otel_trace.set_span_in_context(parent._span) if parent else None
+        self._span = _tracer.start_span(name, context=context)
+
+    def _export(self, duration: float) -> None:
+        self._span.set_attributes({k: v if isinstance(v, (str, bool, int, float)) else str(v)
+                                   for k, v in self.attrs.items() if v is not None})
+        if "error" in self.attrs:
+            self._span.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR, self.attrs["error"]))
+        self._span.end()
+
+
+NOOP = _NoopSpan()
+
+_span_type: type[_Span] | None = None
+if settings.tracing == "log":
+    _span_type = _Span
+elif settings.tracing == "otel":
+    if otel_trace is None:
+        logger.warning("SW_TRACING=otel but opentelemetry-api is not installed; logging spans instead")
+        _span_type = _Span
+    else:
+        _tracer = otel_trace.get_tracer("storywriter")
+        _span_type = _OtelSpan
+
+
+def start_span(name: str, **attrs) -> _Span | _NoopSpan:
+    """A new root span, or the shared no-op span when tracing is off."""
+    if _span_type is None:
+        return NOOP
+    return _span_type(name, attrs)
@@ -0,0 +1,312 @@
+"""End-to-end load test: N concurrent clients against /generate and /persona.
+
+Starts the mock LLM server (bench/mock_llm.py) and the backend as separate
+processes on free ports, uploads synthetic boards (one per client and size, so
+clients never share a generation job), then has every client stream requests
+back to back. Reported per endpoint:
+
+- TTFT: request sent → first `token` event (persona also: first event of any kind)
+- inter-token latency: gaps between consecutive `token` frames; with SSE
+  coalescing on this is the frame cadence, not the model's token rate
+- SSE bytes per request and in total, errors
+
+and for the server process: CPU seconds and utilisation (from /proc, Linux
+only) and event-loop lag (GET /stats → event_loop). Results are printed and can
+be written as JSON (`--out`), and compared with an earlier run (`--compare`).
+
+    cd backend && python -m bench.load --clients 8 --requests 2 --sizes 50,400 --out run.json
+    cd backend && python -m bench.load --clients 8 --compare run.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+from .synthetic import make_board
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+PERSONA_MESSAGE = "Add someone who complicates the keeper's plans."
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _cpu_seconds(pid: int) -> float | None:
+    """utime + stime of a process, from /proc (None where that isn't available)."""
+    try:
+        fields = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0, "n": 0}
+    ordered = sorted(values)
+
+    def pct(q: float) -> float:
+        pos = q * (len(ordered) - 1)
+        lo = int(pos)
+        hi = min(lo + 1, len(ordered) - 1)
+        return round(ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo), 2)
+
+    return {"p50": pct(0.5), "p95": pct(0.95), "p99": pct(0.99), "max": round(ordered[-1], 2), "n": len(ordered)}
+
+
+class Sample:
+    def __init__(self) -> None:
+        self.first_event_ms: float | None = None
+        self.ttft_ms: float | None = None
+        self.gaps_ms: list[float] = []
+        self.bytes = 0
+        self.duration_ms = 0.0
+        self.error: str | None = None
+
+
+async def _stream(client: httpx.AsyncClient, method: str, url: str, **kwargs) -> Sample:
+    sample = Sample()
+    started = time.perf_counter()
+    last_token: float | None = None
+    buffer = b""
+    try:
+        async with client.stream(method, url, **kwargs) as r:
+            if r.status_code != 200:
+                sample.error = f"HTTP {r.status_code}"
+                return sample
+            async for chunk in r.aiter_raw():
+                now = time.perf_counter()
+                sample.bytes += len(chunk)
+                buffer += chunk
+                while b"\n\n" in buffer:
+                    frame, buffer = buffer.split(b"\n\n", 1)
+                    data = next((line[6:] for line in frame.split(b"\n") if line.startswith(b"data: ")), None)
+                    if data is None:
+                        continue  # heartbeat / comment
+                    if sample.first_event_ms is None:
+                        sample.first_event_ms = 1000 * (now - started)
+                    if json.loads(data).get("type") == "token":
+                        if sample.ttft_ms is None:
+                            sample.ttft_ms = 1000 * (now - started)
+                        else:
+                            sample.gaps_ms.append(1000 * (now - last_token))
+                        last_token = now
+    except Exception as e:
+        sample.error = f"{type(e).__name__}: {e}"
+    sample.duration_ms = 1000 * (time.perf_counter() - started)
+    return sample
+
+
+def summarize(samples: list[Sample], wall_s: float) -> dict:
+    ok = [s for s in samples if s.error is None]
+    total_bytes = sum(s.bytes for s in samples)
+    return {
+        "requests": len(samples),
+        "errors": len(samples) - len(ok),
+        "error_examples": sorted({s.error for s in samples if s.error})[:3],
+        "ttft_ms": percentiles([s.ttft_ms for s in ok if s.ttft_ms is not None]),
+        "first_event_ms": percentiles([s.first_event_ms for s in ok if s.first_event_ms is not None]),
+        "inter_token_ms": percentiles([g for s in ok for g in s.gaps_ms]),
+        "duration_ms": percentiles([s.duration_ms for s in ok]),
+        "sse_bytes_total": total_bytes,
+        "sse_bytes_per_request": round(total_bytes / len(samples)) if samples else 0,
+        "requests_per_s": round(len(ok) / wall_s, 3) if wall_s else 0.0,
+    }
+
+
+def _spawn(args: list[str], env: dict[str, str], log: Path) -> subprocess.Popen:
+    return subprocess.Popen(
+        args, cwd=BACKEND_DIR, env={**os.environ, **env},
+        stdout=log.open("wb"), stderr=subprocess.STDOUT,
+    )
+
+
+async def _wait_ready(url: str, proc: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                raise RuntimeError(f"{proc.args} exited with {proc.returncode}")
+            try:
+                if (await client.get(url, timeout=1.0)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} not ready after {timeout:g}s")
+
+
+async def run(args) -> dict:
+    workdir = Path(tempfile.mkdtemp(prefix="sw-load-"))
+    mock_port, app_port = _free_port(), _free_port()
+    mock = _spawn(
+        [sys.executable, "-m", "bench.mock_llm", "--port", str(mock_port), "--ttft", str(args.ttft),
+         "--tps", str(args.tps), "--chunk", str(args.chunk), "--tokens", str(args.tokens)],
+        {}, workdir / "mock.log",
+    )
+    server_env = {
+        "SW_DATA_DIR": str(workdir / "data"),
+        "SW_LLM_BASE_URL": f"http://127.0.0.1:{mock_port}/v1",
+        "SW_LLM_BASE_URLS": "[]",
+        "SW_LLM_MODEL": "mock-writer",
+        "SW_CHAPTER_CACHE": "false",
+        "SW_LOG_LEVEL": "WARNING",
+        **dict(kv.split("=", 1) for kv in args.env),
+    }
+    server = _spawn(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(app_port), "--log-level", "warning"],
+        server_env, workdir / "server.log",
+    )
+    base = f"http://127.0.0.1:{app_port}"
+    try:
+        await _wait_ready(f"http://127.0.0.1:{mock_port}/v1/models", mock)
+        await _wait_ready(f"{base}/health", server)
+        limits = httpx.Limits(max_connections=args.clients * 2 + 4)
+        async with httpx.AsyncClient(base_url=base, timeout=args.timeout, limits=limits) as client:
+            sizes = [int(s) for s in args.sizes.split(",")]
+            boards: list[str] = []
+            for size in sizes:
+                for c in range(args.clients):
+                    board = make_board(size, seed=args.seed + c, board_id=f"load{size}c{c}", max_beats=args.beats)
+                    r = await client.put(f"/boards/{board.id}", content=board.model_dump_json(by_alias=True),
+                                         headers={"Content-Type": "application/json"})
+                    r.raise_for_status()
+                    boards.append(board.id)
+
+            endpoints = ["generate", "persona"] if args.mode == "mixed" else [args.mode]
+            samples: dict[str, list[Sample]] = {e: [] for e in endpoints}
+
+            async def worker(c: int) -> None:
+                mine = [b for b in boards if b.endswith(f"c{c}")]
+                for i in range(args.requests):
+                    endpoint = endpoints[(c + i) % len(endpoints)]
+                    board_id = mine[i % len(mine)]
+                    if endpoint == "generate":
+                        sample = await _stream(client, "POST", f"/boards/{board_id}/generate")
+                    else:
+                        sample = await _stream(client, "POST", f"/boards/{board_id}/persona",
+                                               json={"message": PERSONA_MESSAGE})
+                    samples[endpoint].append(sample)
+
+            stats_before = (await client.get("/stats")).json()["event_loop"]
+            cpu_before = _cpu_seconds(server.pid)
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(c) for c in range(args.clients)))
+            wall = time.perf_counter() - started
+            cpu_after = _cpu_seconds(server.pid)
+            stats_after = (await client.get("/stats")).json()["event_loop"]
+    finally:
+        for proc in (server, mock):
+            proc.terminate()
+        for proc in (server, mock):
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    cpu = None if cpu_before is None or cpu_after is None else round(cpu_after - cpu_before, 3)
+    lag_samples = stats_after["samples"] - stats_before["samples"]
+    lag_total = stats_after["total_ms"] - stats_before["total_ms"]
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git": _git_rev(),
+            "args": vars(args),
+            "server_env": {k: v for k, v in server_env.items() if k != "SW_DATA_DIR"},
+        },
+        "wall_s": round(wall, 3),
+        "server": {
+            "cpu_s": cpu,
+            "cpu_util": round(cpu / wall, 3) if cpu is not None and wall else None,
+            "loop_lag_ms": {
+                "avg": round(lag_total / lag_samples, 2) if lag_samples else 0.0,
+                # the server keeps the last 600 samples (60 s at the default interval)
+                "p99_recent": stats_after["recent_p99_ms"],
+                "max_recent": stats_after["recent_max_ms"],
+            },
+        },
+        "results": {e: summarize(s, wall) for e, s in samples.items()},
+    }
+
+
+def _git_rev() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _flatten(result: dict) -> dict[str, float]:
+    flat: dict[str, float] = {}
+    for endpoint, r in result["results"].items():
+        for metric in ("ttft_ms", "inter_token_ms", "duration_ms"):
+            for q in ("p50", "p95", "p99"):
+                flat[f"{endpoint}.{metric}.{q}"] = r[metric][q]
+        flat[f"{endpoint}.sse_bytes_per_request"] = r["sse_bytes_per_request"]
+        flat[f"{endpoint}.errors"] = r["errors"]
+    server = result["server"]
+    if server["cpu_s"] is not None:
+        flat["server.cpu_s"] = server["cpu_s"]
+    flat["server.loop_lag_ms.avg"] = server["loop_lag_ms"]["avg"]
+    flat["server.loop_lag_ms.p99_recent"] = server["loop_lag_ms"]["p99_recent"]
+    return flat
+
+
+def print_report(result: dict, baseline: dict | None = None) -> None:
+    print(f"wall {result['wall_s']}s, server cpu {result['server']['cpu_s']}s "
+          f"(util {result['server']['cpu_util']})")
+    current = _flatten(result)
+    old = _flatten(baseline) if baseline else {}
+    width = max(len(k) for k in current)
+    for key, value in current.items():
+        line = f"{key:<{width}}  {value:>12}"
+        if key in old:
+            before = old[key]
+            change = f"{(value - before) / before * 100:+.1f}%" if before else ""
+            line += f"  (was {before}, {change})" if change else f"  (was {before})"
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--mode", choices=("generate", "persona", "mixed"), default="mixed")
+    parser.add_argument("--clients", type=int, default=4, help="concurrent clients")
+    parser.add_argument("--requests", type=int, default=2, help="requests per client, back to back")
+    parser.add_argument("--sizes", default="50,400", help="board sizes (nodes), comma-separated")
+    parser.add_argument("--beats", type=int, default=3, help="max beats (= chapters) per board")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ttft", type=float, default=0.2, help="mock LLM: seconds to first token")
+    parser.add_argument("--tps", type=float, default=50.0, help="mock LLM: tokens per second")
+    parser.add_argument("--chunk", type=int, default=1, help="mock LLM: tokens per chunk")
+    parser.add_argument("--tokens", type=int, default=120, help="mock LLM: tokens per reply")
+    parser.add_argument("--timeout", type=float, default=300.0, help="client timeout per request, seconds")
+    parser.add_argument("--env", action="append", default=[], metavar="SW_X=value",
+                        help="extra backend setting (repeatable)")
+    parser.add_argument("--out", help="write the results as JSON here")
+    parser.add_argument("--compare", help="earlier --out file to compare against")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    print_report(result, baseline)
+    if args.out:
+        Path(args.out).write_text(json.dumps(result, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""Micro-benchmarks for the hot Python paths, on synthetic boards of any size.
+
+Covers storage (list / get / peek / save), scenario compilation (cold and
+after a one-card edit), the persona board context and every board tool. Each
+case is timed (best and median per call over several repeats, each long enough
+to be measurable) and run once more under tracemalloc for its peak allocation.
+
+    cd backend && python -m bench.micro                          # sizes 10,100,1000,10000
+    cd backend && python -m bench.micro --sizes 100,1000 --out base.json
+    cd backend && python -m bench.micro --sizes 100,1000 --check base.json --threshold 0.25
+
+With `--check`, any case whose median time (or peak memory) is more than
+`--threshold` above the baseline's, and by more than the two runs' spread, is
+reported and the exit status is 1, so the suite can gate a change. Compare runs
+from the same machine only.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable, Iterator
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from .synthetic import make_board
+
+
+@dataclass
+class Result:
+    name: str
+    best_us: float
+    median_us: float
+    calls: int
+    peak_kib: float
+
+
+def _calibrate(fn: Callable[[], object], min_time: float) -> int:
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - started >= min_time or number >= 1 << 18:
+            return number
+        number *= 4
+
+
+def measure(name: str, fn: Callable[[], object], *, min_time: float, repeat: int) -> Result:
+    fn()  # warm caches and imports
+    number = _calibrate(fn, min_time)
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - started) / number)
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        fn()
+        peak = tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+    return Result(
+        name=name,
+        best_us=round(1e6 * min(times), 2),
+        median_us=round(1e6 * statistics.median(times), 2),
+        calls=number * repeat,
+        peak_kib=round(max(0, peak) / 1024, 1),
+    )
+
+
+def cases(sizes: list[int], boards: int, seed: int) -> Iterator[tuple[str, Callable[[], object]]]:
+    """(name, callable) pairs; setup happens lazily, just before each group."""
+    from app import board_context, scenario, storage
+    from app.board_tools import BoardEditOp, build_board_tools
+    from app.indexed_board import IndexedBoard
+    from app.models import BoardNode, Connection
+
+    # Listing: many small boards.
+    for i in range(boards):
+        storage.save_board(make_board(20, seed=seed + i, board_id=f"list{i}"))
+    storage.flush_index()
+    yield f"storage.list_boards[boards={boards}]", storage.list_boards
+
+    def list_cold():
+        storage._store = storage._make_store()  # index re-read from disk
+        return storage.list_boards()
+
+    yield f"storage.list_boards cold index[boards={boards}]", list_cold
+
+    for size in sizes:
+        tag = f"[n={size}]"
+        board = make_board(size, seed=seed, board_id=f"micro{size}")
+        storage.save_board(board)
+        board_id = board.id
+
+        yield "storage.get_board" + tag, lambda: storage.get_board(board_id)
+        yield "storage.peek_board" + tag, lambda: storage.peek_board(board_id)
+
+        def get_uncached(board_id=board_id):
+            storage.invalidate(board_id)
+            return storage.get_board(board_id)
+
+        yield "storage.get_board uncached" + tag, get_uncached
+
+        to_save = storage.get_board(board_id)
+        yield "storage.save_board" + tag, lambda b=to_save: storage.save_board(b)
+
+        compiled = storage.get_board(board_id)
+
+        def scenario_cold(b=compiled):
+            scenario._memos.clear()
+            return scenario.build_scenario(b)
+
+        yield "scenario.build_scenario cold" + tag, scenario_cold
+
+        edited = storage.get_board(board_id)
+        target = edited.nodes[len(edited.nodes) // 2]
+
+        def scenario_one_edit(b=edited, target=target):
+            b.version += 1  # a new saved version with one changed card
+            b.nodes[len(b.nodes) // 2] = target.model_copy(update={"body": f"edit {b.version}"})
+            return scenario.build_scenario(b)
+
+        yield "scenario.build_scenario one edit" + tag, scenario_one_edit
+
+        viewed = storage.get_board(board_id)
+        message = "Make the keeper's brother more sympathetic and link him to the storm"
+        yield "board_context.build_board_context" + tag, (
+            lambda b=viewed: board_context.build_board_context(b, message, 4000)
+        )
+
+        # Board tools, as the persona uses them: on an IndexedBoard, write-behind persist.
+        index = IndexedBoard(storage.get_board(board_id))
+        tools = {t.name: t for t in build_board_tools(index, lambda b: None)}
+        ids = list(index.nodes)
+        a, b = ids[0], ids[-1]
+        counter = iter(range(1 << 62))
+
+        def call(tool_name: str, **kwargs) -> Callable[[], object]:
+            tool = tools[tool_name].func
+            return lambda: tool(**kwargs)
+
+        def add_then_remove(tool_name: str, **kwargs) -> Callable[[], object]:
+            # Drop the new card again so repeats don't grow the board.
+            tool = tools[tool_name].func
+
+            def run():
+                rightmost = dict(index._rightmost)
+                result = tool(**kwargs)
+                index.remove_node(next(reversed(index.nodes)))
+                index._rightmost.update(rightmost)  # else the next add rescans its lane
+                return result
+
+            return run
+
+        yield "board_tools.get_node" + tag, call("get_node", node_id=a)
+        yield "board_tools.add_character (+remove)" + tag, add_then_remove(
+            "add_character", name="Bench", role="npc", body="x",
+        )
+        yield "board_tools.add_setting (+remove)" + tag, add_then_remove("add_setting", title="Harbor", body="x")
+        yield "board_tools.add_tone (+remove)" + tag, add_then_remove("add_tone", title="Quiet", body="x")
+        yield "board_tools.add_beat (+remove)" + tag, add_then_remove("add_beat", title="Storm", body="x")
+        yield "board_tools.update_node" + tag, (
+            lambda: tools["update_node"].func(node_id=a, body=f"updated {next(counter)}")
+        )
+
+        def delete_node():
+            # Re-add a throwaway card first so there is always one to delete.
+            node_id = f"tmp{next(counter)}"
+            index.add_node(BoardNode(id=node_id, kind="tone", x=0, y=0, title="t"))
+            index.link(Connection(from_=node_id, to=a))
+            return tools["delete_node"].func(node_id=node_id)
+
+        yield "board_tools.delete_node (+re-add)" + tag, delete_node
+
+        def add_connection():
+            result = tools["add_connection"].func(from_id=a, to_id=b, label="rival")
+            index.remove_connection(a, b)
+            return result
+
+        yield "board_tools.add_connection (+unlink)" + tag, add_connection
+
+        def remove_connection():
+            index.link(Connection(from_=a, to=b, label="rival"))
+            return tools["remove_connection"].func(from_id=a, to_id=b)
+
+        yield "board_tools.remove_connection (+re-link)" + tag, remove_connection
+
+        def apply_batch():
+            n = next(counter)
+            return tools["apply_board_ops"].func(ops=[
+                BoardEditOp(op="add", kind="character", ref="$c", name=f"C{n}", role="foil"),
+                BoardEditOp(op="add", kind="beat", ref="$b", title=f"B{n}"),
+                BoardEditOp(op="link", from_id="$c", to_id=a, label="owes"),
+                BoardEditOp(op="update", id=a, body=f"batch {n}"),
+                BoardEditOp(op="delete", id="$b"),
+                BoardEditOp(op="delete", id="$c"),
+            ])
+
+        yield "board_tools.apply_board_ops (6 ops)" + tag, apply_batch
+
+
+def check(results: list[Result], baseline: dict, threshold: float) -> list[str]:
+    """Cases whose median time (or peak memory) regressed by more than `threshold`.
+
+    A single sample is mostly noise at the microsecond scale, so times compare
+    medians over the repeats, and a slowdown must also exceed the runs' own
+    spread (median minus best, on both sides) and a small absolute floor.
+    """
+    previous = {r["name"]: r for r in baseline["results"]}
+    failures = []
+    for r in results:
+        old = previous.get(r.name)
+        if old is None:
+            continue
+        spread = (old["median_us"] - old["best_us"]) + (r.median_us - r.best_us)
+        for field, unit, floor in (("median_us", "µs", max(2.0, 3 * spread)), ("peak_kib", "KiB", 16.0)):
+            before, after = old[field], getattr(r, field)
+            if after > before * (1 + threshold) and after - before > floor:
+                failures.append(f"{r.name}: {field} {before}{unit} -> {after}{unit} "
+                                f"(+{(after / before - 1) * 100:.0f}%)")
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="10,100,1000,10000", help="board sizes (nodes), comma-separated")
+    parser.add_argument("--boards", type=int, default=2000, help="boards for the listing cases")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-time", type=float, default=0.05, help="seconds per timed repeat (at least)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--filter", default="", help="only cases whose name contains this")
+    parser.add_argument("--out", help="write the results as JSON here")
+    parser.add_argument("--check", metavar="BASELINE", help="fail on regressions against this --out file")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown for --check (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    # A throwaway data dir; set before the app reads its settings.
+    os.environ["SW_DATA_DIR"] = tempfile.mkdtemp(prefix="sw-micro-")
+    os.environ.setdefault("SW_BOARD_CACHE_SIZE", "256")
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    results: list[Result] = []
+    print(f"{'case':<52}{'best µs':>12}{'median µs':>12}{'calls':>9}{'peak KiB':>11}")
+    for name, fn in cases(sizes, args.boards, args.seed):
+        if args.filter not in name:
+            continue
+        r = measure(name, fn, min_time=args.min_time, repeat=args.repeat)
+        results.append(r)
+        print(f"{r.name:<52}{r.best_us:>12.1f}{r.median_us:>12.1f}{r.calls:>9}{r.peak_kib:>11.1f}")
+
+    if args.out:
+        Path(args.out).write_text(json.dumps({
+            "meta": {"sizes": sizes, "boards": args.boards, "seed": args.seed, "python": sys.version.split()[0]},
+            "results": [asdict(r) for r in results],
+        }, indent=2) + "\n")
+    if args.check:
+        failures = check(results, json.loads(Path(args.check).read_text()), args.threshold)
+        if failures:
+            print(f"\n{len(failures)} regression(s) over {args.threshold:.0%}:")
+            for line in failures:
+                print("  " + line)
+            sys.exit(1)
+        print(f"\nno regressions over {args.threshold:.0%} against {args.check}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""Deterministic OpenAI-compatible stub server for benchmarks and local runs.
+
+Serves `GET /v1/models` and `POST /v1/chat/completions` (streamed or not)
+with a fixed time to first token, token rate and chunk size, so backend changes
+can be measured without a GPU. Text is drawn from a small vocabulary, seeded by
+the prompt, so the same request always gets the same answer.
+
+When the request carries tools, the replies after each user message are tool
+calls first: one per turn, taken in order from the tool script (`--tool-script`,
+a JSON list of `{"name", "arguments"}`; by default a single `add_character`).
+Once the script is used up it answers in text, like a real model would after
+seeing its tool results.
+
+    cd backend && python -m bench.mock_llm --port 8001 --ttft 0.2 --tps 40
+    SW_LLM_BASE_URL=http://127.0.0.1:8001/v1 uv run uvicorn app.main:app
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+import zlib
+from dataclasses import dataclass, field
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+MODEL = "mock-writer"
+
+_WORDS = (
+    "the keeper climbed the stair again and the lamp burned low over the water "
+    "while the fog rolled in from the harbor she remembered her brother's letter "
+    "and the promise they had made as children on the shore of the island "
+    "nothing moved except the tide and the slow turning light above"
+).split()
+
+DEFAULT_TOOL_SCRIPT = [
+    {
+        "name": "add_character",
+        "arguments": {"name": "Mock Character", "role": "npc · visitor", "body": "Added by the mock server."},
+    },
+]
+
+
+@dataclass
+class MockConfig:
+    ttft: float = 0.2  # seconds before the first chunk
+    tps: float = 40.0  # tokens per second after that; 0 = as fast as possible
+    chunk: int = 1  # tokens per streamed chunk
+    tokens: int = 200  # tokens per text reply, unless the request's max_tokens is lower
+    tool_script: list[dict] = field(default_factory=lambda: list(DEFAULT_TOOL_SCRIPT))
+
+
+def _text_tokens(messages: list[dict], count: int) -> list[str]:
+    prompt = json.dumps(messages, sort_keys=True)
+    rng = random.Random(zlib.crc32(prompt.encode()))
+    return [rng.choice(_WORDS) + " " for _ in range(count)]
+
+
+def _tool_turn(messages: list[dict]) -> int:
+    """Tool-calling replies the model has made since the last user message."""
+    turn = 0
+    for m in messages:
+        if m.get("role") == "user":
+            turn = 0
+        elif m.get("role") == "assistant" and m.get("tool_calls"):
+            turn += 1
+    return turn
+
+
+def _prompt_tokens(messages: list[dict]) -> int:
+    return sum(len(str(m.get("content") or "")) for m in messages) // 4
+
+
+def _chunk(completion_id: str, delta: dict, finish: str | None = None) -> bytes:
+    payload = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": MODEL,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+    }
+    return b"data: " + json.dumps(payload).encode() + b"\n\n"
+
+
+def create_app(config: MockConfig) -> Starlette:
+    stats = {"requests": 0, "streams": 0, "tool_calls": 0}
+
+    async def models(request: Request) -> JSONResponse:
+        return JSONResponse({"object": "list", "data": [{"id": MODEL, "object": "model", "owned_by": "bench"}]})
+
+    async def mock_stats(request: Request) -> JSONResponse:
+        return JSONResponse(stats)
+
+    async def completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        stats["requests"] += 1
+        call = None
+        if body.get("tools"):
+            turn = _tool_turn(messages)
+            if turn < len(config.tool_script):
+                call = config.tool_script[turn]
+        limit = body.get("max_tokens") or body.get("max_completion_tokens") or config.tokens
+        tokens = [] if call else _text_tokens(messages, min(limit, config.tokens))
+        usage = {
+            "prompt_tokens": _prompt_tokens(messages),
+            "completion_tokens": len(tokens) if tokens else 20,
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion_id = "chatcmpl-" + uuid.uuid4().hex[:12]
+        tool_call = None
+        if call:
+            stats["tool_calls"] += 1
+            tool_call = {
+                "id": "call_" + uuid.uuid4().hex[:12],
+                "type": "function",
+                "function": {"name": call["name"], "arguments": json.dumps(call.get("arguments", {}))},
+            }
+
+        if not body.get("stream"):
+            await asyncio.sleep(config.ttft + (len(tokens) / config.tps if config.tps > 0 else 0))
+            message: dict = {"role": "assistant", "content": "".join(tokens) or None}
+            if tool_call:
+                message["tool_calls"] = [tool_call]
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": MODEL,
+                "choices": [{
+                    "index": 0, "message": message,
+                    "finish_reason": "tool_calls" if tool_call else "stop",
+                }],
+                "usage": usage,
+            })
+
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+        stats["streams"] += 1
+
+        async def stream():
+            await asyncio.sleep(config.ttft)
+            yield _chunk(completion_id, {"role": "assistant", "content": ""})
+            if tool_call:
+                args = tool_call["function"]["arguments"]
+                half = len(args) // 2
+                head = {**tool_call, "function": {"name": call["name"], "arguments": args[:half]}}
+                yield _chunk(completion_id, {"tool_calls": [{"index": 0, **head}]})
+                yield _chunk(completion_id, {"tool_calls": [{"index": 0, "function": {"arguments": args[half:]}}]})
+                yield _chunk(completion_id, {}, "tool_calls")
+            else:
+                step = max(1, config.chunk)
+                delay = step / config.tps if config.tps > 0 else 0
+                for i in range(0, len(tokens), step):
+                    if i:
+                        await asyncio.sleep(delay)
+                    yield _chunk(completion_id, {"content": "".join(tokens[i:i + step])})
+                yield _chunk(completion_id, {}, "stop")
+            if include_usage:
+                yield b"data: " + json.dumps({
+                    "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": MODEL, "choices": [], "usage": usage,
+                }).encode() + b"\n\n"
+            yield b"data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return Starlette(routes=[
+        Route("/v1/models", models),
+        Route("/v1/chat/completions", completions, methods=["POST"]),
+        Route("/mock/stats", mock_stats),
+    ])
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--ttft", type=float, default=MockConfig.ttft, help="seconds to first chunk")
+    parser.add_argument("--tps", type=float, default=MockConfig.tps, help="tokens per second (0 = unthrottled)")
+    parser.add_argument("--chunk", type=int, default=MockConfig.chunk, help="tokens per streamed chunk")
+    parser.add_argument("--tokens", type=int, default=MockConfig.tokens, help="tokens per text reply")
+    parser.add_argument("--tool-script", help="JSON file: list of {name, arguments} tool calls, one per turn")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    import uvicorn
+
+    args = parse_args(argv)
+    config = MockConfig(ttft=args.ttft, tps=args.tps, chunk=args.chunk, tokens=args.tokens)
+    if args.tool_script:
+        with open(args.tool_script, encoding="utf-8") as f:
+            config.tool_script = json.load(f)
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Bytes on the wire and CPU time per request for the board JSON endpoints.
+
+Drives the ASGI app in-process (no sockets, no client library) against a
+seeded synthetic board and reports, per endpoint and Accept-Encoding, the
+response size and the process CPU time spent per request. The `identity` rows
+are the uncompressed baseline; `copy` compares the old deep copy with the
+structural copy used for handing out boards.
+
+    cd backend && python -m bench.serialization --nodes 400 --requests 200
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+
+async def _request(app, method: str, path: str, headers: dict[str, str], body: bytes = b"") -> tuple[int, int, dict]:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+        "client": ("127.0.0.1", 0),
+        "server": ("bench", 80),
+    }
+    delivered = False
+
+    async def receive():
+        nonlocal delivered
+        if not delivered:
+            delivered = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return {"type": "http.disconnect"}
+
+    status = 0
+    size = 0
+    response_headers: dict = {}
+
+    async def send(message):
+        nonlocal status, size, response_headers
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            response_headers = {k.decode(): v.decode() for k, v in message["headers"]}
+        elif message["type"] == "http.response.body":
+            size += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, size, response_headers
+
+
+async def _measure(app, method, path, headers, requests) -> tuple[int, int, float]:
+    status = size = 0
+    started = time.process_time()
+    for _ in range(requests):
+        status, size, _ = await _request(app, method, path, headers)
+    cpu_ms = 1000 * (time.process_time() - started) / requests
+    return status, size, cpu_ms
+
+
+async def run(args) -> None:
+    from app import compression, storage
+    from app.main import app
+
+    from .synthetic import make_board
+
+    board = make_board(args.nodes, seed=args.seed)
+    storage.save_board(board)
+    path = f"/boards/{board.id}"
+
+    encodings = ["identity", "gzip"] + (["br"] if compression.brotli is not None else [])
+    print(f"board: {len(board.nodes)} nodes, {len(board.connections)} connections; "
+          f"{args.requests} requests per row")
+    print(f"{'endpoint':<34}{'encoding':<10}{'status':>7}{'bytes':>10}{'cpu ms/req':>12}")
+
+    _, _, first = await _request(app, "GET", path, {})
+    etag = first["etag"]
+    cases = [
+        ("GET /boards/{id}", "GET", path, {}),
+        ("GET /boards/{id}/scenario", "GET", path + "/scenario", {}),
+        ("GET /boards/{id} (If-None-Match)", "GET", path, {"If-None-Match": etag}),
+    ]
+    for label, method, url, extra in cases:
+        for enc in encodings:
+            status, size, cpu = await _measure(
+                app, method, url, {**extra, "Accept-Encoding": enc}, args.requests,
+            )
+            print(f"{label:<34}{enc:<10}{status:>7}{size:>10}{cpu:>12.3f}")
+
+    node_id = board.nodes[0].id
+    moves = iter(range(10**9))
+
+    def patch_body() -> bytes:
+        return b'{"ops":[{"op":"move","id":"%s","x":%d,"y":100}]}' % (node_id.encode(), next(moves))
+
+    # Every PATCH makes a new version, so track it for If-Match.
+    started = time.process_time()
+    for _ in range(args.requests):
+        version = storage.current_version(board.id)
+        status, size, _ = await _request(
+            app, "PATCH", path,
+            {"Content-Type": "application/json", "If-Match": f'"{version}"', "Accept-Encoding": "gzip"},
+            patch_body(),
+        )
+    cpu = 1000 * (time.process_time() - started) / args.requests
+    print(f"{'PATCH /boards/{id} (one move)':<34}{'gzip':<10}{status:>7}{size:>10}{cpu:>12.3f}")
+
+    current = storage.peek_board(board.id)
+    for label, copy in (
+        ("copy: model_copy(deep=True)", lambda: current.model_copy(deep=True)),
+        ("copy: storage._copy", lambda: storage._copy(current)),
+    ):
+        started = time.process_time()
+        for _ in range(args.requests):
+            copy()
+        cpu = 1000 * (time.process_time() - started) / args.requests
+        print(f"{label:<34}{'':<10}{'':>7}{'':>10}{cpu:>12.3f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--nodes", type=int, default=400)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    # A throwaway data dir; the history log would only add disk time to PATCH.
+    os.environ.setdefault("SW_DATA_DIR", tempfile.mkdtemp(prefix="sw-bench-"))
+    os.environ.setdefault("SW_REVISION_HISTORY", "false")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Seeded synthetic boards for the benchmarks.
+
+The same seed always yields the same board, so numbers from two runs (or two
+commits) are comparable. Node text is drawn from a small vocabulary to give
+realistic sizes and compression ratios rather than random bytes.
+"""
+from __future__ import annotations
+
+import random
+
+from app.models import Board, BoardNode, Connection
+
+KINDS = ("character", "world", "tone", "beat")
+# Rough mix of a real board: mostly characters and beats.
+KIND_WEIGHTS = (3, 2, 1, 4)
+LANES = {"character": 120.0, "world": 380.0, "tone": 560.0, "beat": 760.0}
+
+_WORDS = (
+    "the lighthouse keeper harbor storm tide letter brother ship fog lamp night "
+    "winter island silence debt promise coast wreck signal rope salt memory "
+    "secret village bell window stair lantern map compass current shore gull "
+    "returns refuses remembers hides finds breaks keeps waits burns answers"
+).split()
+_NAMES = (
+    "Wren Isaac Mara Tobias Ilse Jonah Petra Alder Sable Corin Nell Odo Ruth "
+    "Silas Vera Hale Ansel Bram Cleo Dagny"
+).split()
+_ROLES = ("protagonist", "foil", "mentor", "antagonist", "npc", "love interest")
+_TAGS = ("haunted", "dutiful", "tender", "weary", "guarded", "restless", "loyal", "proud")
+_LABELS = ("estranged sibling", "owes a debt to", "mentor of", "rival", "keeps a secret from")
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    text = " ".join(rng.choice(_WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def make_node(rng: random.Random, node_id: str, kind: str, x: float) -> BoardNode:
+    y = LANES[kind] + rng.uniform(-40, 40)
+    body = " ".join(_sentence(rng, rng.randint(8, 18)) for _ in range(rng.randint(1, 4)))
+    if kind == "character":
+        return BoardNode(
+            id=node_id, kind=kind, x=x, y=y,
+            name=f"{rng.choice(_NAMES)} {rng.choice(_NAMES)}son",
+            role=f"{rng.choice(_ROLES)} · {rng.choice(_WORDS)} {rng.choice(_WORDS)}",
+            age=rng.randint(12, 80),
+            body=body,
+            tags=rng.sample(_TAGS, rng.randint(1, 3)),
+        )
+    return BoardNode(id=node_id, kind=kind, x=x, y=y, title=_sentence(rng, 3)[:-1], body=body)
+
+
+def make_board(
+    nodes: int = 200,
+    connections: int | None = None,
+    *,
+    seed: int = 0,
+    board_id: str = "bench",
+    max_beats: int | None = None,
+) -> Board:
+    """A board with `nodes` cards and (by default ~1.2× as many) connections.
+
+    `max_beats` caps the plot beats (each one is a chapter to generate); the
+    remaining cards are drawn from the other kinds.
+    """
+    rng = random.Random(seed)
+    board = Board(id=board_id, title=f"Synthetic board ({nodes} nodes)")
+    beats = 0
+    for i in range(nodes):
+        kind = rng.choices(KINDS, KIND_WEIGHTS)[0]
+        if kind == "beat" and max_beats is not None and beats >= max_beats:
+            kind = rng.choices(KINDS[:3], KIND_WEIGHTS[:3])[0]
+        beats += kind == "beat"
+        board.nodes.append(make_node(rng, f"n{i + 1}", kind, 160.0 + 240.0 * (i // 4)))
+    if connections is None:
+        connections = int(nodes * 1.2)
+    seen: set[frozenset[str]] = set()
+    ids = [n.id for n in board.nodes]
+    attempts = 0
+    while len(board.connections) < connections and len(ids) > 1 and attempts < connections * 10:
+        attempts += 1
+        a, b = rng.sample(ids, 2)
+        key = frozenset((a, b))
+        if key in seen:
+            continue
+        seen.add(key)
+        board.connections.append(Connection(from_=a, to=b, label=rng.choice(_LABELS)))
+    return board
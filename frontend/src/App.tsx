@@ -4,8 +4,9 @@ import { Landing } from './components/Landing'
 import { ReaderPage } from './components/ReaderPage'
 import { ScenarioPage } from './components/ScenarioPage'
 import { applyPalette } from './data/palettes'
-import { createBoard, getBoard, listBoards, saveBoard } from './api/client'
-import type { Board, BoardSummary, PaletteName } from './types/board'
+import { ConflictError, createBoard, getBoard, listBoards, patchBoard, saveBoard } from './api/client'
+import { applyBoardPatch, diffBoard } from './api/boardDiff'
+import type { Board, BoardSummary, BoardUpdate, PaletteName } from './types/board'
 
 type Screen = 'landing' | 'board' | 'scenario' | 'reader'
 type SaveState = 'idle' | 'pending' | 'saving' | 'saved' | 'error'
@@ -21,6 +22,7 @@ export default function App() {
   const [saveError, setSaveError] = useState<string | null>(null)
   const saveTimer = useRef<number | null>(null)
   const lastSavedJson = useRef<string>('')
+  const lastSavedBoard = useRef<Board | null>(null)
   const pendingBoard = useRef<Board | null>(null)
   const inFlight = useRef<Promise<void> | null>(null)
 
@@ -42,8 +44,32 @@ export default function App() {
     pendingBoard.current = null
     setSaveState('saving')
     try {
-      await saveBoard(b)
+      const base = lastSavedBoard.current
+      let version: number | undefined
+      if (base && base.id === b.id && base.version !== undefined) {
+        // Send only what changed since the last save, guarded by the version it was based on.
+        const ops = diffBoard(base, b)
+        try {
+          version = ops.length ? (await patchBoard(b.id, base.version, ops)).version : base.version
+        } catch (e) {
+          if (!(e instanceof ConflictError)) throw e
+          // Someone else (usually the persona) saved in between: replay our edits on
+          // top of their version and adopt the merged board.
+          const fresh = await getBoard(b.id)
+          await patchBoard(b.id, fresh.version ?? 0, ops)
+          const merged = await getBoard(b.id)
+          lastSavedJson.current = JSON.stringify(merged)
+          lastSavedBoard.current = merged
+          setBoard(merged)
+          setSaveError(null)
+          setSaveState(pendingBoard.current ? 'pending' : 'saved')
+          return
+        }
+      } else {
+        version = (await saveBoard(b)).version
+      }
       lastSavedJson.current = json
+      lastSavedBoard.current = { ...b, version }
       setSaveError(null)
       setSaveState(pendingBoard.current ? 'pending' : 'saved')
     } catch (e) {
@@ -110,6 +136,7 @@ export default function App() {
 
   const replaceBoard = useCallback((b: Board) => {
     lastSavedJson.current = JSON.stringify(b)
+    lastSavedBoard.current = b
     pendingBoard.current = null
     if (saveTimer.current) {
       window.clearTimeout(saveTimer.current)
@@ -119,10 +146,34 @@ export default function App() {
     setBoard(b)
   }, [])
 
+  // Persona edits arrive as a patch against the version they were made on. If that
+  // is the version we last saved, apply it to both the saved baseline and the
+  // working board, so unsaved local edits survive and autosave sends only those;
+  // otherwise we're out of sync and adopt the full board.
+  const applyBoardUpdate = useCallback(
+    async (u: BoardUpdate) => {
+      const base = lastSavedBoard.current
+      if (!base) return
+      if (!u.board && base.version === u.baseVersion) {
+        const stamp = { version: u.version, updatedAt: u.updatedAt }
+        const saved = { ...applyBoardPatch(base, u.patch), ...stamp }
+        lastSavedBoard.current = saved
+        lastSavedJson.current = JSON.stringify(saved)
+        setBoard((cur) => (cur && cur.id === saved.id ? { ...applyBoardPatch(cur, u.patch), ...stamp } : cur))
+        return
+      }
+      replaceBoard(u.board ?? (await getBoard(base.id)))
+    },
+    [replaceBoard],
+  )
+
+  const savedVersion = useCallback(() => lastSavedBoard.current?.version, [])
+
   const openBoard = useCallback(async (id: string) => {
     try {
       const b = await getBoard(id)
       lastSavedJson.current = JSON.stringify(b)
+      lastSavedBoard.current = b
       pendingBoard.current = null
       setSaveState('saved')
       setBoard(b)
@@ -136,6 +187,7 @@ export default function App() {
     try {
       const b = await createBoard('Untitled board')
       lastSavedJson.current = JSON.stringify(b)
+      lastSavedBoard.current = b
       pendingBoard.current = null
       setSaveState('saved')
       setBoard(b)
@@ -260,7 +312,12 @@ export default function App() {
           <Landing boards={boards} onStart={startBoard} onOpen={openBoard} />
         )}
         {screen === 'board' && board && (
-          <CanvasBoard board={board} onBoardChange={setBoard} onBoardReplaced={replaceBoard} />
+          <CanvasBoard
+            board={board}
+            onBoardChange={setBoard}
+            onBoardUpdate={applyBoardUpdate}
+            savedVersion={savedVersion}
+          />
         )}
         {screen === 'scenario' && board && (
           <ScenarioPage
@@ -0,0 +1,101 @@
+import type { Board, BoardNode, BoardOp, BoardPatch, Connection } from '../types/board'
+
+const FIELDS = ['name', 'title', 'role', 'age', 'body', 'tags'] as const
+
+const pairKey = (c: Connection) => [c.from, c.to].sort().join('\u0000')
+
+function field(n: BoardNode, k: (typeof FIELDS)[number]): unknown {
+  return (n as unknown as Record<string, unknown>)[k]
+}
+
+/** Ops that turn `prev` into `next`, for PATCH /boards/{id}. */
+export function diffBoard(prev: Board, next: Board): BoardOp[] {
+  const ops: BoardOp[] = []
+
+  const set: Extract<BoardOp, { op: 'set' }> = { op: 'set' }
+  if (next.title !== prev.title) set.title = next.title
+  if (next.personaName !== prev.personaName) set.personaName = next.personaName
+  if (next.palette !== prev.palette) set.palette = next.palette
+  if (Object.keys(set).length > 1) ops.push(set)
+
+  const before = new Map(prev.nodes.map((n) => [n.id, n]))
+  const after = new Set(next.nodes.map((n) => n.id))
+  const replaced = new Set<string>()
+  for (const n of prev.nodes) {
+    if (!after.has(n.id)) ops.push({ op: 'delete', id: n.id })
+  }
+  for (const n of next.nodes) {
+    const old = before.get(n.id)
+    if (!old || old.kind !== n.kind) {
+      if (old) {
+        ops.push({ op: 'delete', id: n.id })
+        replaced.add(n.id)
+      }
+      ops.push({ op: 'add', node: n })
+      continue
+    }
+    if (old.x !== n.x || old.y !== n.y) ops.push({ op: 'move', id: n.id, x: n.x, y: n.y })
+    const fields: Record<string, unknown> = {}
+    for (const k of FIELDS) {
+      const a = field(old, k)
+      const b = field(n, k)
+      if (JSON.stringify(a) !== JSON.stringify(b)) fields[k] = b ?? null
+    }
+    if (Object.keys(fields).length) {
+      ops.push({ op: 'update', id: n.id, fields: fields as Extract<BoardOp, { op: 'update' }>['fields'] })
+    }
+  }
+
+  // Deleting a node drops its connections server-side: skip those unlinks, and
+  // re-link anything that touches a node that was deleted and re-added.
+  const gone = new Set([...prev.nodes.filter((n) => !after.has(n.id)).map((n) => n.id), ...replaced])
+  const prevConns = new Map(prev.connections.map((c) => [pairKey(c), c]))
+  const nextConns = new Map(next.connections.map((c) => [pairKey(c), c]))
+  for (const [key, c] of prevConns) {
+    if (!nextConns.has(key) && !gone.has(c.from) && !gone.has(c.to)) {
+      ops.push({ op: 'unlink', from: c.from, to: c.to })
+    }
+  }
+  for (const [key, c] of nextConns) {
+    const old = prevConns.get(key)
+    const touchesReplaced = replaced.has(c.from) || replaced.has(c.to)
+    if (!old || old.label !== c.label || touchesReplaced) ops.push({ op: 'link', from: c.from, to: c.to, label: c.label })
+  }
+  return ops
+}
+
+/** Replays a backend board patch onto `board` (mirrors `apply_patch` in board_ops.py). */
+export function applyBoardPatch(board: Board, patch: BoardPatch): Board {
+  const removed = new Set(patch.removedNodes)
+  const upserts = new Map(patch.nodes.map((n) => [n.id, n]))
+  let nodes = board.nodes
+    .filter((n) => !removed.has(n.id))
+    .map((n) => {
+      const u = upserts.get(n.id)
+      upserts.delete(n.id)
+      return u ?? n
+    })
+  nodes.push(...upserts.values())
+  if (patch.nodeOrder) {
+    const byId = new Map(nodes.map((n) => [n.id, n]))
+    nodes = patch.nodeOrder.map((id) => byId.get(id)!)
+  }
+
+  const gone = new Set(patch.removedConnections.map(pairKey))
+  const connUpserts = new Map(patch.connections.map((c) => [pairKey(c), c]))
+  let connections = board.connections
+    .filter((c) => !gone.has(pairKey(c)))
+    .map((c) => {
+      const key = pairKey(c)
+      const u = connUpserts.get(key)
+      connUpserts.delete(key)
+      return u ?? c
+    })
+  connections.push(...connUpserts.values())
+  if (patch.connectionOrder) {
+    const byKey = new Map(connections.map((c) => [pairKey(c), c]))
+    connections = patch.connectionOrder.map(([from, to]) => byKey.get(pairKey({ from, to }))!)
+  }
+
+  return { ...board, ...patch.board, nodes, connections }
+}
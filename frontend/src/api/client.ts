@@ -1,8 +1,11 @@
-import type { Board, BoardSummary, Scenario } from '../types/board'
+import type { Board, BoardOp, BoardPatch, BoardSummary, PatchResult, Scenario } from '../types/board'
 
 const API_BASE = (import.meta.env.VITE_API_BASE as string | undefined) ?? 'http://localhost:8000'
 
+export class ConflictError extends Error {}
+
 async function json<T>(res: Response): Promise<T> {
+  if (res.status === 412) throw new ConflictError(`${res.status} ${res.statusText}`)
   if (!res.ok) throw new Error(`${res.status} ${res.statusText}`)
   return (await res.json()) as T
 }
@@ -25,6 +28,16 @@ export async function saveBoard(board: Board): Promise<Board> {
   )
 }
 
+export async function patchBoard(id: string, version: number, ops: BoardOp[]): Promise<PatchResult> {
+  return json(
+    await fetch(`${API_BASE}/boards/${id}`, {
+      method: 'PATCH',
+      headers: { 'Content-Type': 'application/json', 'If-Match': `"${version}"` },
+      body: JSON.stringify({ ops }),
+    }),
+  )
+}
+
 export async function createBoard(title: string): Promise<Board> {
   return json(
     await fetch(`${API_BASE}/boards`, {
@@ -47,13 +60,18 @@ export interface StreamEvent {
   output?: string
   chapter?: { num: string; title: string }
   board?: Board
+  // board_updated
+  baseVersion?: number
+  version?: number
+  updatedAt?: string
+  patch?: BoardPatch
 }
 
-export async function* streamGeneration(boardId: string, signal?: AbortSignal): AsyncGenerator<StreamEvent> {
-  const res = await fetch(`${API_BASE}/boards/${boardId}/generate`, {
-    method: 'POST',
-    signal,
-  })
+// Parses an SSE body: `data:` lines carry the JSON event, `id:` lines are
+// recorded in `cursor` (for Last-Event-ID resume) and `:` lines are heartbeat
+// comments.
+async function* readEvents(res: Response, cursor?: { lastId: number }): AsyncGenerator<StreamEvent> {
+  if (!res.ok) throw new Error(`Stream failed: ${res.status}`)
   if (!res.body) throw new Error('No stream body')
   const reader = res.body.getReader()
   const decoder = new TextDecoder()
@@ -65,10 +83,16 @@ export async function* streamGeneration(boardId: string, signal?: AbortSignal):
     const parts = buffer.split('\n\n')
     buffer = parts.pop() ?? ''
     for (const part of parts) {
-      const line = part.replace(/^data: /, '').trim()
-      if (!line) continue
+      const lines = part.split('\n')
+      const data = lines
+        .filter((line) => line.startsWith('data:'))
+        .map((line) => line.slice(5).replace(/^ /, ''))
+        .join('\n')
+      const id = lines.find((line) => line.startsWith('id:'))
+      if (id && cursor) cursor.lastId = Number(id.slice(3).trim())
+      if (!data) continue
       try {
-        yield JSON.parse(line) as StreamEvent
+        yield JSON.parse(data) as StreamEvent
       } catch {
         // ignore
       }
@@ -76,35 +100,47 @@ export async function* streamGeneration(boardId: string, signal?: AbortSignal):
   }
 }
 
+// Generation runs as a server-side job; if the connection drops before `done`
+// we reattach to the job and continue after the last event we saw.
+export async function* streamGeneration(boardId: string, signal?: AbortSignal): AsyncGenerator<StreamEvent> {
+  let res = await fetch(`${API_BASE}/boards/${boardId}/generate`, {
+    method: 'POST',
+    signal,
+  })
+  const jobId = res.headers.get('X-Job-Id')
+  const cursor = { lastId: 0 }
+  let retries = 0
+  while (true) {
+    try {
+      for await (const evt of readEvents(res, cursor)) {
+        retries = 0
+        yield evt
+        if (evt.type === 'done') return
+      }
+    } catch (err) {
+      if (!jobId || signal?.aborted || retries >= 3) throw err
+    }
+    if (!jobId || retries >= 3) return
+    retries += 1
+    await new Promise((resolve) => setTimeout(resolve, 500 * retries))
+    res = await fetch(`${API_BASE}/jobs/${jobId}/events`, {
+      headers: { 'Last-Event-ID': String(cursor.lastId) },
+      signal,
+    })
+  }
+}
+
 export async function* streamPersona(
   boardId: string,
   message: string,
   signal?: AbortSignal,
+  boardVersion?: number,
 ): AsyncGenerator<StreamEvent> {
   const res = await fetch(`${API_BASE}/boards/${boardId}/persona`, {
     method: 'POST',
     headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify({ message }),
+    body: JSON.stringify({ message, boardVersion }),
     signal,
   })
-  if (!res.body) throw new Error('No stream body')
-  const reader = res.body.getReader()
-  const decoder = new TextDecoder()
-  let buffer = ''
-  while (true) {
-    const { value, done } = await reader.read()
-    if (done) break
-    buffer += decoder.decode(value, { stream: true })
-    const parts = buffer.split('\n\n')
-    buffer = parts.pop() ?? ''
-    for (const part of parts) {
-      const line = part.replace(/^data: /, '').trim()
-      if (!line) continue
-      try {
-        yield JSON.parse(line) as StreamEvent
-      } catch {
-        // ignore
-      }
-    }
-  }
+  yield* readEvents(res)
 }
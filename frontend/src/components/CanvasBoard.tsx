@@ -1,5 +1,5 @@
 import { Fragment, useEffect, useRef, useState, type PointerEvent as ReactPointerEvent } from 'react'
-import type { Board, BoardNode, Connection, NodeKind } from '../types/board'
+import type { Board, BoardNode, BoardUpdate, Connection, NodeKind } from '../types/board'
 import { LANES } from '../data/sampleBoard'
 import { Connections } from './Connections'
 import { Inspector } from './Inspector'
@@ -9,7 +9,8 @@ import { Persona } from './Persona'
 interface Props {
   board: Board
   onBoardChange: (board: Board) => void
-  onBoardReplaced: (board: Board) => void
+  onBoardUpdate: (update: BoardUpdate) => void
+  savedVersion: () => number | undefined
 }
 
 type Tool = 'select' | 'connect' | NodeKind
@@ -30,7 +31,7 @@ function makeNode(kind: NodeKind, x: number, y: number): BoardNode {
 
 const BOUNDS = { minX: 100, minY: 60, maxX: 1000, maxY: 870 }
 
-export function CanvasBoard({ board, onBoardChange, onBoardReplaced }: Props) {
+export function CanvasBoard({ board, onBoardChange, onBoardUpdate, savedVersion }: Props) {
   const [selectedId, setSelectedId] = useState<string | null>(null)
   const [tool, setTool] = useState<Tool>('select')
   const [zoom, setZoom] = useState(1)
@@ -355,7 +356,8 @@ export function CanvasBoard({ board, onBoardChange, onBoardReplaced }: Props) {
           personaName={board.personaName}
           boardId={board.id}
           onDismiss={() => setPersonaOpen(false)}
-          onBoardReplaced={onBoardReplaced}
+          onBoardUpdate={onBoardUpdate}
+          savedVersion={savedVersion}
         />
       )}
       {!personaOpen && !selectedNode && (
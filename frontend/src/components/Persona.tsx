@@ -1,12 +1,13 @@
 import { useEffect, useRef, useState } from 'react'
 import { streamPersona } from '../api/client'
-import type { Board } from '../types/board'
+import type { BoardUpdate } from '../types/board'
 
 interface Props {
   personaName: string
   boardId: string
   onDismiss: () => void
-  onBoardReplaced: (board: Board) => void
+  onBoardUpdate: (update: BoardUpdate) => void
+  savedVersion: () => number | undefined
 }
 
 type Entry =
@@ -15,6 +16,8 @@ type Entry =
   | { kind: 'tool'; name: string; output?: string }
 
 const TOOL_LABELS: Record<string, string> = {
+  get_node: 'reading card',
+  apply_board_ops: 'editing board',
   add_character: 'adding character',
   add_setting: 'adding setting',
   add_tone: 'adding tone',
@@ -25,7 +28,7 @@ const TOOL_LABELS: Record<string, string> = {
   remove_connection: 'unlinking cards',
 }
 
-export function Persona({ personaName, boardId, onDismiss, onBoardReplaced }: Props) {
+export function Persona({ personaName, boardId, onDismiss, onBoardUpdate, savedVersion }: Props) {
   const [input, setInput] = useState('')
   const [entries, setEntries] = useState<Entry[]>([])
   const [streaming, setStreaming] = useState(false)
@@ -48,7 +51,7 @@ export function Persona({ personaName, boardId, onDismiss, onBoardReplaced }: Pr
     const ctrl = new AbortController()
     abortRef.current = ctrl
     try {
-      for await (const evt of streamPersona(boardId, text, ctrl.signal)) {
+      for await (const evt of streamPersona(boardId, text, ctrl.signal, savedVersion())) {
         if (evt.type === 'token' && evt.content) {
           setEntries((xs) => {
             const copy = [...xs]
@@ -79,8 +82,14 @@ export function Persona({ personaName, boardId, onDismiss, onBoardReplaced }: Pr
             }
             return copy
           })
-        } else if (evt.type === 'board_updated' && evt.board) {
-          onBoardReplaced(evt.board)
+        } else if (evt.type === 'board_updated' && evt.patch) {
+          await onBoardUpdate({
+            baseVersion: evt.baseVersion ?? -1,
+            version: evt.version ?? -1,
+            updatedAt: evt.updatedAt,
+            patch: evt.patch,
+            board: evt.board,
+          })
         }
       }
     } catch (err) {
@@ -50,6 +50,7 @@ export interface Board {
   nodes: BoardNode[]
   connections: Connection[]
   updatedAt?: string
+  version?: number
 }
 
 export interface BoardSummary {
@@ -64,6 +65,44 @@ export interface BoardSummary {
 
 export type PaletteName = 'warm' | 'cool' | 'rose' | 'ink'
 
+export type NodeFields = Partial<Pick<CharacterNode, 'name' | 'role' | 'age' | 'body' | 'tags'>> & {
+  title?: string
+}
+
+export type BoardOp =
+  | { op: 'move'; id: string; x: number; y: number }
+  | { op: 'update'; id: string; fields: { [K in keyof NodeFields]: NodeFields[K] | null } }
+  | { op: 'add'; node: BoardNode }
+  | { op: 'delete'; id: string }
+  | { op: 'link'; from: string; to: string; label?: string }
+  | { op: 'unlink'; from: string; to: string }
+  | { op: 'set'; title?: string; personaName?: string; palette?: PaletteName }
+
+/** Entities changed between two versions; same shape as the backend's board patch. */
+export interface BoardPatch {
+  board: Partial<Pick<Board, 'title' | 'personaName' | 'palette'>>
+  nodes: BoardNode[]
+  removedNodes: string[]
+  connections: Connection[]
+  removedConnections: Connection[]
+  nodeOrder?: string[]
+  connectionOrder?: [string, string][]
+}
+
+export interface PatchResult extends BoardPatch {
+  version: number
+  updatedAt?: string
+}
+
+/** Payload of a persona `board_updated` event. */
+export interface BoardUpdate {
+  baseVersion: number
+  version: number
+  updatedAt?: string
+  patch: BoardPatch
+  board?: Board
+}
+
 export interface Scenario {
   title: string
   pov: string